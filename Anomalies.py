@@ -0,0 +1,101 @@
+import pandas as pd
+import numpy as np
+
+from Features import STATS, feature_groups
+
+# Vectorized synthetic anomalous subflows for evaluating the autoencoder (see Loader.py).
+# A subflow is described by its packet rate, its duration and, for every feature group,
+# a low and a high packet value (low_share of its packets take the low one). Features
+# follow in closed form, as Extractor would compute them from the packets, so millions
+# of rows are generated with array operations and no packets.
+
+# Profile parameters: a number, or a (min, max) range drawn uniformly per subflow.
+# Packet sizes are whole bytes; TCP flags and TTL are the same for every packet
+PROFILES = {
+    # ICMP flood with same size packets
+    'flood': {'pkts_sec': 20, 'duration': 6, 'pkt_size': 64, 'tcp_flags': 0, 'ttl': 64},
+    # Flood whose packet size grows from subflow to subflow, pkt_size_min to pkt_size_max
+    'gradient': {'pkts_sec': 20, 'duration': 6, 'pkt_size_min': 64, 'pkt_size_max': 500,
+                 'tcp_flags': 0, 'ttl': 64},
+    # A few small packets over minutes (e.g. SYN scan / slow read)
+    'low_and_slow': {'pkts_sec': (0.05, 0.5), 'duration': (60, 600), 'pkt_size': (40, 120),
+                     'tcp_flags': 0x002, 'ttl': 64},
+    # Short high-rate bursts mixing small requests and large writes
+    'bursty': {'pkts_sec': (50, 500), 'duration': (1, 10), 'pkt_size': (64, 128),
+               'burst_size': (1000, 1500), 'low_share': (0.2, 0.8), 'tcp_flags': 0x018, 'ttl': 64},
+}
+
+def _draw(rng, value, num, integer=False):
+    # num values of a parameter: constant or uniform over a (min, max) range
+    if np.ndim(value) == 0:
+        return np.full(num, value, dtype=np.float64)
+    low, high = value
+    if integer:
+        return rng.integers(low, high, num, endpoint=True).astype(np.float64)
+    return rng.uniform(low, high, num)
+
+def two_value_stats(low, high, num_low, num_pkts):
+    # Feature statistics of num_pkts packet values, num_low of them low and the rest high
+    # (low <= high): mean, sample std, linear-interpolation quartiles, min and max
+    num_high = num_pkts - num_low
+    mean = (num_low * low + num_high * high) / num_pkts
+    std = np.sqrt((num_low * (low - mean)**2 + num_high * (high - mean)**2) / (num_pkts - 1))
+    stats = {'Avg': mean, 'Std': np.where(low == high, 0, std)}
+    for stat, q in (('Q1', .25), ('Q2', .5), ('Q3', .75)):
+        position = q * (num_pkts - 1) # Index into the sorted values
+        below = np.floor(position)
+        lower = np.where(below < num_low, low, high)
+        upper = np.where(np.minimum(below + 1, num_pkts - 1) < num_low, low, high)
+        stats[stat] = lower + (upper - lower) * (position - below)
+    stats['Min'] = np.where(num_low > 0, low, high)
+    stats['Max'] = np.where(num_high > 0, high, low)
+    return stats
+
+def anomalous_subflows(columns, num, profile='flood', seed=None, **params):
+    # num anomalous feature rows with the given columns (any feature groups)
+    params = {**PROFILES[profile], **params}
+    rng = np.random.default_rng(seed)
+    pkts_sec = _draw(rng, params['pkts_sec'], num)
+    duration = np.maximum(_draw(rng, params['duration'], num), 1) # As Extractor
+    num_pkts = np.maximum(np.round(pkts_sec * duration), 2) # Extractor's threshold
+    if profile == 'gradient':
+        # Equal steps (whole bytes) from the minimum size
+        step = np.floor((params['pkt_size_max'] - params['pkt_size_min']) / num)
+        low = params['pkt_size_min'] + step * np.arange(num)
+    else:
+        low = _draw(rng, params['pkt_size'], num, integer=True)
+    high, num_low = low, num_pkts
+    if 'burst_size' in params:
+        high = np.maximum(_draw(rng, params['burst_size'], num, integer=True), low)
+        num_low = np.round(_draw(rng, params['low_share'], num) * num_pkts)
+    features = {}
+    features['Pkts_Per_Sec'] = num_pkts / duration
+    total_bytes = (num_low * low + (num_pkts - num_low) * high) / 1e3 # KB
+    features['KBits_Per_Sec'] = (total_bytes * 8) / duration # KB to KBit/s
+    values = {
+        'Pkt_Size': (low, high, num_low),
+        'TCP_Flags': (_draw(rng, params['tcp_flags'], num, integer=True),) * 2 + (num_pkts,),
+        'TTL': (_draw(rng, params['ttl'], num, integer=True),) * 2 + (num_pkts,),
+    }
+    for group in feature_groups(columns):
+        low, high, num_low = values[group]
+        stats = two_value_stats(low, high, num_low, num_pkts)
+        for stat in STATS:
+            features[group + '_' + stat] = stats[stat]
+    features['Anomaly'] = np.ones(num, dtype=np.int64) # Mark as anomaly
+    return pd.DataFrame(features, columns=list(columns))
+
+def anomaly_mix(columns, counts, seed=None, params=None):
+    # Rows of several profiles, e.g. counts={'flood': 1000, 'bursty': 500};
+    # params optionally overrides parameters per profile
+    params = params or {}
+    seeds = np.random.SeedSequence(seed).spawn(len(counts))
+    return pd.concat([anomalous_subflows(columns, num, profile, seed=child, **params.get(profile, {}))
+                      for (profile, num), child in zip(counts.items(), seeds)], ignore_index=True)
+
+def with_anomalies(df, counts, seed=None, params=None):
+    # Clean subflows plus anomalies, shuffled reproducibly
+    data = [df, anomaly_mix(df.columns, counts, seed, params)]
+    dirty = pd.concat(data, ignore_index=True)
+    order = np.random.default_rng(seed).permutation(dirty.shape[0])
+    return dirty.iloc[order]
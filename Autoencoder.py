@@ -1,41 +1,36 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
 import tensorflow as tf
 import tensorflow_addons as tfa
+import itertools
+import json
 import os
+import time
 
 # To suppress a warning when saving LeakyReLU
 import absl.logging
 absl.logging.set_verbosity(absl.logging.ERROR)
 
-from tensorflow.keras.callbacks import ModelCheckpoint, TensorBoard, EarlyStopping
+from tensorflow.keras.callbacks import Callback, ModelCheckpoint, TensorBoard, EarlyStopping
 from tensorflow.keras.layers import Dense, Layer, LeakyReLU
 from tensorflow.keras.models import load_model
 from tensorflow.keras import Sequential, activations
 from tensorflow import matmul
-from sklearn.model_selection import train_test_split
-from sklearn.metrics import accuracy_score, confusion_matrix, recall_score, f1_score, precision_score
 from tensorflow.keras.constraints import UnitNorm
 
-# In[1]:
-# See Extractor.py
-print("Loading Modbus Features...")
-
-path = 'C:\\Users\\Michael\\Dropbox\\Backup\\Michael\\Shared\\Documents\\VTEC\\US Ignite\\features\\'
-file = 'usignite_flows_features.csv'
-df = pd.read_csv(path+file)
-df.info()
-
-features = df.iloc[0:,:-1].columns
-target = ['Anomaly']
+from Dataset import features_to_npy, split_rows
+from Loader import load_scorer, model_files, model_stem
+from Scorer import export_weights
 
-X = df[features]
-y = df[target]
+# In[1]:
 
-print("Splitting data...")
-X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=.2, shuffle=False, random_state=42)
+def load_features(file):
+    # Feature table (see Extractor.py) split into training and validation features
+    df = pd.read_csv(file)
+    features = df.iloc[0:,:-1].columns
+    X = df[features]
+    train_rows = split_rows(X.shape[0])
+    return X.iloc[:train_rows], X.iloc[train_rows:]
 
 # In[2]:
 
@@ -61,83 +56,279 @@ class DenseTranspose(Layer):
 
 # In[3]:
 
-# Auto encoder parameters
-print("Initializing autoencoder...")
-nb_epoch = 700
-batch_size = 32
-input_dim = X_train.shape[1]
-hidden_dim = input_dim - 1
-latent_dim = np.ceil(input_dim / 2)
-
-# Options
-model_name = 'autoencoder_model_16_ddos.tf'
-
-#act1 = "relu"
-#act2 = "linear"
-act1 = act2 = LeakyReLU()
-#encoder_constraint = decoder_constraint = None
-
-encoder_constraint = UnitNorm(axis=0)
-decoder_constraint = UnitNorm(axis=1)
-
-opt = tf.keras.optimizers.Adam()
-opt = tfa.optimizers.Lookahead(opt)
-
-# Base Encoder 
-hidden_1 = Dense(hidden_dim, 
-                 activation=act1, 
-                 input_shape=(input_dim,), 
-                 kernel_constraint=encoder_constraint)
-latent = Dense(latent_dim, 
-               activation=act1, 
-               kernel_constraint=encoder_constraint)
-
-# Base Decoder 
-#hidden_2 = Dense(hidden_dim, activation=act1, kernel_constraint=decoder_constraint) 
-#out = Dense(input_dim, activation=act2, kernel_constraint=decoder_constraint)
-
-# Dense Transpose Decoder (Tied Weights)
-hidden_2 = DenseTranspose(latent, activation=act1)
-out = DenseTranspose(hidden_1, activation=act2)
-
-# Model
-autoencoder = Sequential()
-autoencoder.add(hidden_1)
-autoencoder.add(latent)
-autoencoder.add(hidden_2)
-autoencoder.add(out)
-autoencoder.summary()
+# The 16 configurations are every combination of these options, numbered in
+# itertools.product order: 1 has all off, 16 (autoencoder_model_16_ddos) all on
+OPTIONS = ['leaky_relu', 'unit_norm', 'tied', 'lookahead']
+
+def configurations():
+    # {number: options}
+    return {i + 1: dict(zip(OPTIONS, flags))
+            for i, flags in enumerate(itertools.product((False, True), repeat=len(OPTIONS)))}
+
+def model_name(number):
+    return f'autoencoder_model_{number}_ddos.tf'
+
+def build_autoencoder(input_dim, leaky_relu=True, unit_norm=True, tied=True, lookahead=True):
+    # Auto encoder parameters
+    hidden_dim = input_dim - 1
+    latent_dim = int(np.ceil(input_dim / 2))
+
+    if leaky_relu:
+        act1 = act2 = LeakyReLU()
+    else:
+        act1 = "relu"
+        act2 = "linear"
+    if unit_norm:
+        encoder_constraint = UnitNorm(axis=0)
+        decoder_constraint = UnitNorm(axis=1)
+    else:
+        encoder_constraint = decoder_constraint = None
+
+    opt = tf.keras.optimizers.Adam()
+    if lookahead:
+        # tfa wraps only the legacy optimizers (the default ones since TensorFlow 2.11)
+        opt = tfa.optimizers.Lookahead(tf.keras.optimizers.legacy.Adam())
+
+    # Base Encoder
+    hidden_1 = Dense(hidden_dim,
+                     activation=act1,
+                     input_shape=(input_dim,),
+                     kernel_constraint=encoder_constraint)
+    latent = Dense(latent_dim,
+                   activation=act1,
+                   kernel_constraint=encoder_constraint)
+
+    if tied:
+        # Dense Transpose Decoder (Tied Weights)
+        hidden_2 = DenseTranspose(latent, activation=act1)
+        out = DenseTranspose(hidden_1, activation=act2)
+    else:
+        # Base Decoder
+        hidden_2 = Dense(hidden_dim, activation=act1, kernel_constraint=decoder_constraint)
+        out = Dense(input_dim, activation=act2, kernel_constraint=decoder_constraint)
+
+    # Model
+    autoencoder = Sequential()
+    autoencoder.add(hidden_1)
+    autoencoder.add(latent)
+    autoencoder.add(hidden_2)
+    autoencoder.add(out)
+
+    autoencoder.compile(metrics=['accuracy'],
+                        loss='mean_squared_error',
+                        optimizer=opt)
+    return autoencoder
+
+def layer_activations(number):
+    # Activation of each layer of configuration number (as build_autoencoder), for
+    # export_weights: DenseTranspose layers revived without custom_objects lose theirs
+    if configurations()[number]['leaky_relu']:
+        return [LeakyReLU()] * 4
+    return ['relu', 'relu', 'relu', 'linear']
 
 # In[4]:
-# Compile and Run model
-print("Compiling autoencoder...")
-
-autoencoder.compile(metrics=['accuracy'],
-                    loss='mean_squared_error',
-                    optimizer=opt)
-
-# Save checkpoint to upload the best model for testing
-model_path = 'models/'
-if not os.path.exists(model_path):
-    os.makedirs(model_path)
-cp = ModelCheckpoint(filepath=model_path+model_name,
-                     save_best_only=True,verbose=0)
-
-# Parameter helps prevent overfitting
-#early_stop = EarlyStopping(monitor='val_loss', mode='min', verbose=1, patience=50)
-
-history = autoencoder.fit(X_train, X_train,
-                    epochs=nb_epoch,
-                    batch_size=batch_size,
-                    shuffle=True,
-                    validation_data=(X_test, X_test),
-                    callbacks=[cp]).history
+
+class BestWeights(Callback):
+    # Keeps the weights of the epoch with the lowest val_loss and restores them
+    # when training ends (so the model matches the best checkpoint). With a baseline
+    # (val_loss before training) the starting weights win unless an epoch beats it
+    def __init__(self, baseline=np.inf):
+        super().__init__()
+        self.baseline = baseline
+    def on_train_begin(self, logs=None):
+        self.best, self.best_epoch = self.baseline, None
+        self.weights = self.model.get_weights() if np.isfinite(self.baseline) else None
+    def on_epoch_end(self, epoch, logs=None):
+        if logs['val_loss'] < self.best:
+            self.best, self.best_epoch, self.weights = logs['val_loss'], epoch, self.model.get_weights()
+    def on_train_end(self, logs=None):
+        if self.weights is not None:
+            self.model.set_weights(self.weights)
+
+class BestCheckpoint(Callback):
+    # Weights and optimizer state of the best val_loss epoch as a tf.train.Checkpoint:
+    # variables only, a fraction of a SavedModel, and enough to resume training
+    def __init__(self, directory, baseline=np.inf):
+        super().__init__()
+        self.directory = directory
+        self.baseline = baseline
+    def on_train_begin(self, logs=None):
+        self.best = self.baseline
+        checkpoint = tf.train.Checkpoint(model=self.model, optimizer=self.model.optimizer)
+        self.manager = tf.train.CheckpointManager(checkpoint, self.directory, max_to_keep=1)
+    def on_epoch_end(self, epoch, logs=None):
+        if logs['val_loss'] < self.best:
+            self.best = logs['val_loss']
+            self.manager.save()
+
+def checkpoint_dir(model_file):
+    return model_stem(model_file) + '_ckpt'
+
+def train_autoencoder(autoencoder, X_train, X_test, model_file, nb_epoch=700, batch_size=32,
+                      callbacks=(), verbose=1, weights_only=False):
+    # X_train and X_test: feature tables, or batched (X, X) datasets (see Dataset.py)
+    # Save checkpoint to upload the best model for testing
+    model_path = os.path.dirname(model_file)
+    if model_path and not os.path.exists(model_path):
+        os.makedirs(model_path)
+    if weights_only:
+        # Resumable by fine_tune; export_weights gives Loader.py its weights
+        cp = BestCheckpoint(checkpoint_dir(model_file))
+    else:
+        cp = ModelCheckpoint(filepath=model_file,
+                             save_best_only=True,verbose=0)
+
+    # Parameter helps prevent overfitting
+    #early_stop = EarlyStopping(monitor='val_loss', mode='min', verbose=1, patience=50)
+
+    if isinstance(X_train, tf.data.Dataset):
+        # Streamed: batched and shuffled by the pipeline
+        return autoencoder.fit(X_train,
+                               epochs=nb_epoch,
+                               validation_data=X_test,
+                               callbacks=[cp, *callbacks],
+                               verbose=verbose).history
+    return autoencoder.fit(X_train, X_train,
+                           epochs=nb_epoch,
+                           batch_size=batch_size,
+                           shuffle=True,
+                           validation_data=(X_test, X_test),
+                           callbacks=[cp, *callbacks],
+                           verbose=verbose).history
 
 # In[5]:
-# Plot loss against epochs
-plt.plot(history['loss'], 'b', label='Training loss')
-plt.plot(history['val_loss'], 'r', label='Validation loss')
-plt.legend(loc='upper right')
-plt.xlabel('Epochs')
-plt.ylabel('Loss, [mae]')
-plt.show()
\ No newline at end of file
+
+def training_state(model_file, number):
+    # Rows of the feature table the model has been trained on, and its refreshes
+    state_file = model_stem(model_file) + '_state.json'
+    if not os.path.exists(state_file):
+        return {'model': number, 'trained_rows': 0, 'refreshes': []}
+    with open(state_file) as f:
+        return json.load(f)
+
+def save_training_state(model_file, state):
+    with open(model_stem(model_file) + '_state.json', 'w') as f:
+        json.dump(state, f, indent=1)
+
+def replay_sample(matrix, num_rows, size, rng):
+    # Uniform sample (in row order) of the first num_rows rows, read from a memory map
+    if num_rows == 0 or size == 0:
+        return np.zeros((0, matrix.shape[1]), dtype=matrix.dtype)
+    return np.asarray(matrix[np.sort(rng.choice(num_rows, min(size, num_rows), replace=False))])
+
+def set_layer_weights(autoencoder, scorer):
+    # Kernels and biases of a Scorer (see Scorer.py) into a model of the same configuration
+    for layer, (kernel, bias, activation, alpha) in zip(autoencoder.layers, scorer.layers):
+        if isinstance(layer, DenseTranspose):
+            layer.biases.assign(bias) # Kernel tied to an earlier layer
+        else:
+            layer.set_weights([kernel, bias])
+
+def fine_tune(features_file, number=16, model_path='models/', replay_rows=10**5, nb_epoch=50, patience=5,
+              batch_size=32, seed=0, verbose=1, min_rows=10):
+    # Warm start: restore the model and optimizer state of the last refresh and train on
+    # the rows appended to features_file since (e.g. by Incremental.py) plus a bounded
+    # replay sample of older rows, until val_loss stops improving for patience epochs.
+    # Returns the refresh record (None while fewer than min_rows rows are new: they
+    # are kept for the next refresh)
+    model_file = model_path + model_name(number)
+    state = training_state(model_file, number)
+    matrix = np.load(features_to_npy(features_file), mmap_mode='r')
+    old_rows = state['trained_rows']
+    new = np.asarray(matrix[old_rows:])
+    if new.shape[0] < max(min_rows, 1):
+        print(f"{new.shape[0]} new subflows, fewer than {min_rows}: not refreshing yet")
+        return None
+    rng = np.random.default_rng(seed + len(state['refreshes']))
+    replay = replay_sample(matrix, old_rows, replay_rows, rng)
+    # Same split as Autoencoder.load_features for each part: the latest rows validate
+    new_train, replay_train = split_rows(new.shape[0]), split_rows(replay.shape[0])
+    X_train = np.concatenate([replay[:replay_train], new[:new_train]])
+    X_test = np.concatenate([replay[replay_train:], new[new_train:]])
+    if X_train.shape[0] == 0:
+        print(f"{new.shape[0]} new subflows leave none to train on: not refreshing yet")
+        return None
+
+    autoencoder = build_autoencoder(matrix.shape[1], **configurations()[number])
+    checkpoint = tf.train.Checkpoint(model=autoencoder, optimizer=autoencoder.optimizer)
+    latest = tf.train.latest_checkpoint(checkpoint_dir(model_file))
+    if latest:
+        # Optimizer slots are restored when they are created, on the first step
+        checkpoint.restore(latest).expect_partial()
+    elif os.path.exists(model_file):
+        # Model trained before checkpoints: weights only (layer by layer, through its
+        # Scorer export), fresh optimizer
+        set_layer_weights(autoencoder, load_scorer(model_file))
+    baseline = autoencoder.evaluate(X_test, X_test, batch_size=batch_size, verbose=0)[0] \
+        if (latest or os.path.exists(model_file)) and X_test.shape[0] else np.inf
+
+    print(f"Fine-tuning model {number} on {new.shape[0]} new and {replay.shape[0]} replayed subflows...")
+    best = BestWeights(baseline)
+    early_stop = EarlyStopping(monitor='val_loss', mode='min', verbose=verbose, patience=patience)
+    start = time.perf_counter()
+    history = autoencoder.fit(X_train, X_train,
+                              epochs=nb_epoch,
+                              batch_size=batch_size,
+                              shuffle=True,
+                              validation_data=(X_test, X_test),
+                              callbacks=[BestCheckpoint(checkpoint_dir(model_file), baseline), best, early_stop],
+                              verbose=verbose).history
+    improved = best.best_epoch is not None
+    if improved:
+        # Best weights for Scorer (changed weights also invalidate the Calibration)
+        export_weights(autoencoder, model_files(model_file)[0])
+    refresh = {
+        'new_rows': int(new.shape[0]),
+        'replay_rows': int(replay.shape[0]),
+        'epochs': len(history['loss']),
+        'baseline_val_loss': float(baseline),
+        'best_val_loss': float(best.best),
+        'improved': improved,
+        'train_s': time.perf_counter() - start,
+    }
+    if improved:
+        # Otherwise the new rows are trained on again (with any later ones) next refresh
+        state['trained_rows'] = int(matrix.shape[0])
+    state['refreshes'].append(refresh)
+    save_training_state(model_file, state)
+    return refresh
+
+# In[6]:
+
+def train_model(X_train, X_test, number=16, model_path='models/', nb_epoch=700, batch_size=32, trained_rows=None):
+    # Train configuration number from scratch. The best epoch is kept as a weights-only
+    # checkpoint (resumed by fine_tune) and exported for Scorer (Loader.py)
+    if isinstance(X_train, tf.data.Dataset):
+        input_dim = X_train.element_spec[0].shape[1]
+    else:
+        input_dim = X_train.shape[1]
+        trained_rows = X_train.shape[0] + X_test.shape[0]
+
+    print("Initializing autoencoder...")
+    autoencoder = build_autoencoder(input_dim, **configurations()[number])
+    autoencoder.summary()
+
+    model_file = model_path + model_name(number)
+    best = BestWeights()
+    history = train_autoencoder(autoencoder, X_train, X_test, model_file, nb_epoch, batch_size,
+                                callbacks=[best], weights_only=True)
+    export_weights(autoencoder, model_files(model_file)[0])
+    # Rows fine_tune starts after
+    save_training_state(model_file, {'model': number, 'trained_rows': trained_rows, 'refreshes': []})
+    return history
+
+def plot_history(history):
+    # Plot loss against epochs
+    import matplotlib.pyplot as plt
+    plt.plot(history['loss'], 'b', label='Training loss')
+    plt.plot(history['val_loss'], 'r', label='Validation loss')
+    plt.legend(loc='upper right')
+    plt.xlabel('Epochs')
+    plt.ylabel('Loss, [mae]')
+    plt.show()
+
+if __name__ == "__main__":
+    # Autoencoder.py --features <features.csv> [train options]: see Pipeline.py
+    import sys
+    from Pipeline import main
+    main(['train', *sys.argv[1:]])
\ No newline at end of file
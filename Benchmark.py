@@ -0,0 +1,610 @@
+import pandas as pd
+import numpy as np
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import resource
+import struct
+import tempfile
+import time
+import tracemalloc
+
+from Anomalies import anomaly_mix
+from Dataset import count_rows, csv_datasets, features_to_npy, memmap_datasets, split_rows
+from Extractor import Extractor, interval_starts
+from Parallel import ParallelExtractor
+from Profile import Profiler
+from Schema import ip_strings
+from Features import STATS, feature_columns, feature_groups, multi_segment_stats
+from Scorer import Scorer
+
+# tshark field order (see docs/Modbus Extract Scripts.txt)
+capture_cols = ['frame.time_epoch', 'ip.len', 'ip.proto', 'ip.src', 'ip.dst', 'ip.ttl',
+                'tcp.srcport', 'tcp.dstport', 'tcp.flags', 'udp.srcport', 'udp.dstport']
+
+def synthetic_capture(num_pkts, num_flows, seed=0):
+    # Random TCP/UDP packets spread over num_flows destination flows
+    rng = np.random.default_rng(seed)
+    flow = rng.integers(0, num_flows, num_pkts)
+    tcp = (flow % 4) != 0
+    times = 1.6e9 + np.sort(rng.uniform(0, num_pkts / 100, num_pkts))
+    df = pd.DataFrame({
+        'frame.time_epoch': times,
+        'ip.len': rng.integers(40, 300, num_pkts),
+        'ip.proto': np.where(tcp, 6, 17),
+        'ip.src': '10.0.0.' + pd.Series(rng.integers(1, 255, num_pkts)).astype(str),
+        'ip.dst': '10.1.' + pd.Series(flow // 250).astype(str) + '.' + pd.Series(flow % 250).astype(str),
+        'ip.ttl': 64,
+        'tcp.srcport': pd.Series(rng.integers(1024, 65535, num_pkts)).where(tcp).astype('Int64'),
+        'tcp.dstport': pd.Series(502, index=range(num_pkts)).where(tcp).astype('Int64'),
+        'tcp.flags': np.where(tcp, '0x0018', None),
+        'udp.srcport': pd.Series(rng.integers(1024, 65535, num_pkts)).where(~tcp).astype('Int64'),
+        'udp.dstport': pd.Series(5020, index=range(num_pkts)).where(~tcp).astype('Int64'),
+    }, columns=capture_cols)
+    return df
+
+def write_capture(path, file, num_pkts, num_flows, seed=0):
+    df = synthetic_capture(num_pkts, num_flows, seed)
+    df.to_csv(path + file, index=False, float_format='%.9f')
+
+def traffic_chunk(rng, t0, duration, rate, mix, poll_period, polling, bursty):
+    # Packets of one time slice [t0, t0 + duration) as (time, dst, dstport, proto, len, src, srcport, flags)
+    parts = []
+    # Modbus polling: each master/slave pair exchanges a request and a response every poll_period
+    period_start = np.ceil((t0 - polling['phase']) / poll_period)
+    period_end = np.ceil((t0 + duration - polling['phase']) / poll_period)
+    num = (period_end - period_start).astype(np.int64)
+    pair = np.repeat(np.arange(len(num)), num)
+    step = np.arange(num.sum()) - np.repeat(np.cumsum(num) - num, num)
+    request = polling['phase'][pair] + (period_start[pair] + step) * poll_period + rng.normal(0, 2e-4, len(pair))
+    response = request + rng.uniform(2e-3, 8e-3, len(pair))
+    parts.append((request, polling['slave'][pair], np.full(len(pair), 502), 6, 64,
+                  polling['master'][pair], polling['port'][pair], '0x0018'))
+    parts.append((response, polling['master'][pair], polling['port'][pair], 6, polling['reply'][pair],
+                  polling['slave'][pair], np.full(len(pair), 502), '0x0018'))
+    # Bursty flows: trains of closely spaced large packets to a few destinations
+    burst_pkts = rng.poisson(mix[1] * rate * duration)
+    sizes = rng.geometric(1 / 50, max(burst_pkts // 50, 1))
+    sizes = sizes[np.cumsum(sizes) <= burst_pkts] if sizes.sum() > burst_pkts else sizes
+    flow = np.repeat(rng.integers(0, len(bursty['dst']), len(sizes)), sizes)
+    first = np.repeat(t0 + rng.uniform(0, duration, len(sizes)), sizes)
+    gaps = rng.exponential(1e-3, sizes.sum())
+    burst_start = np.cumsum(sizes) - sizes
+    elapsed = np.cumsum(gaps) - np.repeat(np.cumsum(gaps)[burst_start] - gaps[burst_start], sizes)
+    parts.append((first + elapsed, bursty['dst'][flow], bursty['port'][flow], bursty['proto'][flow],
+                  rng.integers(200, 1501, len(flow)), rng.integers(0, 2**16, len(flow)) | 0x0A000000,
+                  rng.integers(1024, 65536, len(flow)), '0x0018'))
+    # Many tiny flows (1-3 packets), e.g. DNS lookups and scans, to random destinations
+    num_tiny = rng.poisson(mix[2] * rate * duration / 2)
+    sizes = rng.integers(1, 4, num_tiny)
+    first = np.repeat(t0 + rng.uniform(0, duration, num_tiny), sizes)
+    count = sizes.sum()
+    udp = np.repeat(rng.random(num_tiny) < 0.7, sizes)
+    parts.append((first + rng.uniform(0, 0.05, count), np.repeat(rng.integers(0, 2**24, num_tiny) | 0x0B000000, sizes),
+                  np.repeat(rng.integers(1, 65536, num_tiny), sizes), np.where(udp, 17, 6),
+                  rng.integers(60, 120, count), rng.integers(0, 2**16, count) | 0x0A000000,
+                  rng.integers(1024, 65536, count), np.where(udp, None, '0x0002')))
+    columns = [np.concatenate([np.broadcast_to(part[i], len(part[0])) for part in parts]) for i in range(8)]
+    keep = (columns[0] >= t0) & (columns[0] < t0 + duration)
+    order = np.argsort(columns[0][keep], kind='stable')
+    return [values[keep][order] for values in columns]
+
+def traffic_frame(columns, rng, non_ip):
+    # tshark CSV columns (capture_cols) for generated packets; a few rows are non-IP (e.g. ARP)
+    times, dst, dstport, proto, length, src, srcport, flags = columns
+    num_pkts = len(times)
+    ip = rng.random(num_pkts) >= non_ip
+    tcp = ip & (proto == 6)
+    udp = ip & (proto == 17)
+    def addresses(values):
+        return pd.Series(ip_strings(values.astype(np.uint32))).where(ip)
+    def ports(values, mask):
+        return pd.Series(values).where(mask).astype('Int64')
+    return pd.DataFrame({
+        'frame.time_epoch': 1.6e9 + times,
+        'ip.len': ports(length, ip),
+        'ip.proto': ports(proto, ip),
+        'ip.src': addresses(src),
+        'ip.dst': addresses(dst),
+        'ip.ttl': ports(np.where(dst >= 0x0B000000, 128, 64), ip),
+        'tcp.srcport': ports(srcport, tcp),
+        'tcp.dstport': ports(dstport, tcp),
+        'tcp.flags': pd.Series(flags).where(tcp),
+        'udp.srcport': ports(srcport, udp),
+        'udp.dstport': ports(dstport, udp),
+    }, columns=capture_cols)
+
+def synthetic_traffic(num_pkts, seed=0, rate=10**4, mix=(0.5, 0.3, 0.2), poll_period=0.1,
+                      num_bursty=50, chunksize=10**6, non_ip=0.001):
+    # Deterministic tshark-style capture in time order, generated in chunks of about chunksize
+    # packets so any size fits in memory: Modbus polling, bursty and tiny flows (fractions in mix)
+    rng = np.random.default_rng([seed, 0])
+    num_pairs = max(round(mix[0] * rate * poll_period / 2), 1)
+    polling = {
+        'phase': rng.uniform(0, poll_period, num_pairs),
+        'master': rng.integers(0, 2**8, num_pairs) | 0x0A000100,
+        'slave': np.arange(num_pairs) | 0x0A010000,
+        'port': rng.integers(1024, 65536, num_pairs),
+        'reply': 2 * rng.integers(1, 64, num_pairs) + 49, # Read holding registers response
+    }
+    bursty = {
+        'dst': np.arange(num_bursty) | 0x0A020000,
+        'port': rng.choice([80, 443, 5020], num_bursty),
+        'proto': rng.choice([6, 17], num_bursty),
+    }
+    duration = chunksize / rate
+    done = 0
+    chunk = 0
+    while done < num_pkts:
+        chunk_rng = np.random.default_rng([seed, chunk + 1])
+        columns = traffic_chunk(chunk_rng, chunk * duration, duration, rate, mix, poll_period, polling, bursty)
+        columns = [values[:num_pkts - done] for values in columns]
+        done += len(columns[0])
+        chunk += 1
+        yield traffic_frame(columns, chunk_rng, non_ip)
+
+def write_traffic(path, file, num_pkts, seed=0, **kwargs):
+    # CSV as tshark -T fields -E header=y -E separator=, writes it
+    header = True
+    with open(path + file, 'w', newline='') as f:
+        for df in synthetic_traffic(num_pkts, seed, **kwargs):
+            df.to_csv(f, header=header, index=False, float_format='%.9f')
+            header = False
+
+def ip_bytes(address):
+    return bytes(int(part) for part in address.split('.'))
+
+def write_pcap(path, file, df):
+    # Classic little-endian pcap (ns timestamps) of Ethernet/IPv4 TCP or UDP packets
+    with open(path + file, 'wb') as f:
+        f.write(struct.pack('<IHHiIII', 0xa1b23c4d, 2, 4, 0, 0, 65535, 1))
+        for row in df.itertuples(index=False):
+            time_ns = round(row[0] * 1e9)
+            ip_len, proto, src, dst, ttl = int(row[1]), int(row[2]), row[3], row[4], int(row[5])
+            if proto == 6:
+                l4 = struct.pack('>HHIIBBHHH', int(row[6]), int(row[7]), 0, 0, 5 << 4,
+                                 int(row[8], 16), 0, 0, 0)
+            else:
+                l4 = struct.pack('>HHHH', int(row[9]), int(row[10]), ip_len - 20, 0)
+            ip = struct.pack('>BBHHHBBH4s4s', 0x45, 0, ip_len, 0, 0, ttl, proto, 0, ip_bytes(src), ip_bytes(dst))
+            frame = b'\x00' * 12 + b'\x08\x00' + ip + l4
+            frame += b'\x00' * (14 + ip_len - len(frame))
+            f.write(struct.pack('<IIII', time_ns // 10**9, time_ns % 10**9, len(frame), len(frame)))
+            f.write(frame)
+
+def bench_partition(sizes=(10**4, 10**5, 10**6), flow_ratio=100, method="interval"):
+    # Time partitionFlows alone; ns/packet should stay flat as packet count grows
+    print(f"{'packets':>10} {'flows':>8} {'seconds':>10} {'ns/packet':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp + os.sep
+        for num_pkts in sizes:
+            num_flows = max(num_pkts // flow_ratio, 1)
+            write_capture(path, 'bench.csv', num_pkts, num_flows)
+            extractor = Extractor(path, 'bench.csv', method)
+            extractor.dropNaN()
+            extractor.convertColumns()
+            start = time.perf_counter()
+            extractor.partitionFlows()
+            elapsed = time.perf_counter() - start
+            print(f"{num_pkts:>10} {len(extractor.store):>8} {elapsed:>10.3f} {elapsed / num_pkts * 1e9:>10.1f}")
+
+def bench_ingest(sizes=(10**4, 10**5, 10**6), flow_ratio=100):
+    # Load + dropNaN + convertColumns from a tshark CSV vs reading the pcap directly
+    print(f"{'packets':>10} {'csv s':>10} {'pcap s':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp + os.sep
+        for num_pkts in sizes:
+            df = synthetic_capture(num_pkts, max(num_pkts // flow_ratio, 1))
+            df.to_csv(path + 'bench.csv', index=False, float_format='%.9f')
+            write_pcap(path, 'bench.pcap', df)
+            timings = []
+            for file in ('bench.csv', 'bench.pcap'):
+                start = time.perf_counter()
+                extractor = Extractor(path, file, "interval")
+                extractor.dropNaN()
+                extractor.convertColumns()
+                timings.append(time.perf_counter() - start)
+            print(f"{num_pkts:>10} {timings[0]:>10.3f} {timings[1]:>10.3f}")
+
+def bench_schema(num_pkts=10**6, flow_ratio=100):
+    # Size of the converted packet table (see Schema.PACKET_DTYPES)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp + os.sep
+        write_capture(path, 'bench.csv', num_pkts, max(num_pkts // flow_ratio, 1))
+        tracemalloc.start()
+        extractor = Extractor(path, 'bench.csv', "interval")
+        extractor.dropNaN()
+        extractor.convertColumns()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        table = extractor.df.memory_usage(deep=True).sum()
+        print(f"{num_pkts} packets: {table / num_pkts:.1f} bytes/packet in table, {peak / num_pkts:.1f} bytes/packet peak")
+        print(extractor.df.dtypes)
+
+def legacy_interval_starts(times, offsets, interval):
+    # Previous findIndices loop: rescans the rest of the flow for every subflow
+    starts = []
+    for i in range(len(offsets) - 1):
+        start_index = offsets[i]
+        while True:
+            starts.append(start_index)
+            sub_frame = (times[start_index:offsets[i+1]] - times[start_index]) / 1e9
+            beyond = np.flatnonzero(sub_frame > interval)
+            if len(beyond) == 0:
+                break
+            start_index += beyond[0]
+    return np.array(starts, dtype=np.int64)
+
+def bench_windows(sizes=(10**5, 10**6, 10**7), legacy_max=10**5, interval=5, rate=10, seed=0):
+    # One long polling flow at ~rate packets/sec with jittered arrivals
+    print(f"{'packets':>10} {'subflows':>9} {'legacy s':>10} {'vector s':>10}")
+    rng = np.random.default_rng(seed)
+    for num_pkts in sizes:
+        gaps = rng.exponential(1e9 / rate, num_pkts).astype(np.int64)
+        times = np.cumsum(gaps)
+        offsets = np.array([0, num_pkts], dtype=np.int64)
+        start = time.perf_counter()
+        starts = interval_starts(times, offsets, interval)
+        vector = time.perf_counter() - start
+        legacy = float('nan')
+        if num_pkts <= legacy_max:
+            start = time.perf_counter()
+            assert np.array_equal(legacy_interval_starts(times, offsets, interval), starts)
+            legacy = time.perf_counter() - start
+        print(f"{num_pkts:>10} {len(starts):>9} {legacy:>10.3f} {vector:>10.3f}")
+
+def legacy_segment_stats(column, offsets):
+    # Previous extractSubflowFeatures loop: pandas statistics of every subflow
+    rows = []
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        values = pd.Series(column[start:end])
+        rows.append([values.mean(), values.std(), values.quantile(.25), values.median(), values.quantile(.75),
+                     values.min(), values.max()])
+    return dict(zip(STATS, np.array(rows, dtype=np.float64).T))
+
+def bench_features(num_subflows=2000, long_subflow=70000, seed=0):
+    # Segmented statistics vs the per-subflow pandas loop, on short subflows and one
+    # long one: quartiles, min, max and means equal, std to float rounding
+    rng = np.random.default_rng(seed)
+    lengths = np.append(rng.geometric(0.05, num_subflows), long_subflow)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    columns = [rng.integers(40, 1500, offsets[-1]).astype(np.uint16),
+               rng.choice([0x10, 0x18, 0x02, 0x12], offsets[-1]).astype(np.uint16),
+               rng.integers(32, 129, offsets[-1]).astype(np.uint8)]
+    start = time.perf_counter()
+    stats = multi_segment_stats(columns, offsets)
+    vector = time.perf_counter() - start
+    start = time.perf_counter()
+    legacy = [legacy_segment_stats(column, offsets) for column in columns]
+    legacy_s = time.perf_counter() - start
+    print(f"{'group':>6} {'std max rel diff':>17} {'std equal':>10}")
+    for i, (new, old) in enumerate(zip(stats, legacy)):
+        for stat in STATS:
+            if stat != 'Std':
+                assert np.array_equal(new[stat], old[stat]), stat
+        both = np.isfinite(old['Std'])
+        assert np.array_equal(both, np.isfinite(new['Std']))
+        assert np.allclose(new['Std'][both], old['Std'][both], rtol=1e-12, atol=0)
+        rel = np.max(np.abs(new['Std'][both] - old['Std'][both]) / np.maximum(old['Std'][both], 1e-300))
+        print(f"{i:>6} {rel:>17.2e} {np.mean(new['Std'][both] == old['Std'][both]):>10.4f}")
+    print(f"{offsets[-1]} packets, {len(lengths)} subflows: legacy {legacy_s:.3f} s, vector {vector:.3f} s")
+
+def bench_parallel(num_pkts=10**6, flow_ratio=100, workers=None, method="interval"):
+    # Subflow and feature stages on 1..N worker processes (results must match serial)
+    workers = workers or range(1, os.cpu_count() + 1)
+    print(f"{'workers':>8} {'seconds':>10} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = tmp + os.sep
+        write_capture(path, 'bench.csv', num_pkts, max(num_pkts // flow_ratio, 1))
+        serial = None
+        for num_workers in [0] + list(workers):
+            if num_workers:
+                extractor = ParallelExtractor(path, 'bench.csv', method, workers=num_workers)
+            else:
+                extractor = Extractor(path, 'bench.csv', method)
+            extractor.dropNaN()
+            extractor.convertColumns()
+            extractor.partitionFlows()
+            extractor.linkKeys()
+            start = time.perf_counter()
+            extractor.findIndices()
+            extractor.partitionSubflows()
+            extractor.extractSubflowFeatures()
+            elapsed = time.perf_counter() - start
+            if serial is None:
+                serial = (elapsed, extractor.subflow_features)
+                label = 'serial'
+            else:
+                assert extractor.subflow_features.equals(serial[1])
+                label = num_workers
+            print(f"{label:>8} {elapsed:>10.3f} {serial[0] / elapsed:>8.2f}")
+
+# Extractor stages in pipeline order (load is the constructor)
+stages = ['load', 'dropNaN', 'convertColumns', 'partitionFlows', 'linkKeys', 'findIndices',
+          'partitionSubflows', 'extractSubflowFeatures', 'shuffleSubflows', 'featuresToCSV']
+
+def run_stages(path, file, method, trace=False):
+    # Profile of every stage; traced memory only if trace (tracing slows numpy and pandas down)
+    profiler = Profiler(trace_memory=trace)
+    extractor = Extractor(path, file, method, profiler=profiler)
+    for stage in stages[1:]:
+        getattr(extractor, stage)()
+    return [{'stage': record['stage'], 'wall': record['wall_s'], 'cpu': record['cpu_s'],
+             'peak_bytes': record['peak_traced_bytes'], 'peak_rss_bytes': record['peak_rss_bytes']}
+            for record in profiler.stages]
+
+def bench_stages(sizes=(10**4, 10**5, 10**6), method="interval", seed=0, memory=True, report=None, **traffic):
+    # Time (and peak memory, from a second traced run) of every stage on synthetic traffic
+    results = []
+    print(f"{'packets':>10} {'stage':<24} {'wall s':>9} {'cpu s':>9} {'peak MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        # Features are written next to the csv directory (see Extractor.featuresPath)
+        path = os.path.join(tmp, 'csv') + os.sep
+        os.makedirs(path)
+        for num_pkts in sizes:
+            write_traffic(path, 'bench.csv', num_pkts, seed, **traffic)
+            rows = run_stages(path, 'bench.csv', method)
+            if memory:
+                for row, traced in zip(rows, run_stages(path, 'bench.csv', method, trace=True)):
+                    row['peak_bytes'] = traced['peak_bytes']
+            for row in rows:
+                row['packets'] = num_pkts
+                peak = row['peak_bytes'] / 2**20 if memory else float('nan')
+                print(f"{num_pkts:>10} {row['stage']:<24} {row['wall']:>9.3f} {row['cpu']:>9.3f} {peak:>9.1f}")
+            results.extend(rows)
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 # KB on Linux
+    if report is not None:
+        with open(report, 'w') as f:
+            json.dump({'method': method, 'seed': seed, 'traffic': traffic, 'max_rss_bytes': max_rss,
+                       'stages': results}, f, indent=1)
+    return results
+
+def compare_stages(before, after):
+    # Per-stage wall time and peak memory ratios (after / before) of two bench_stages reports
+    runs = []
+    for report in (before, after):
+        with open(report) as f:
+            runs.append({(row['packets'], row['stage']): row for row in json.load(f)['stages']})
+    print(f"{'packets':>10} {'stage':<24} {'wall x':>8} {'peak x':>8}")
+    for key, old in runs[0].items():
+        new = runs[1].get(key)
+        if new is not None:
+            wall = new['wall'] / old['wall'] if old['wall'] else float('nan')
+            peak = new['peak_bytes'] / old['peak_bytes'] if old['peak_bytes'] and new['peak_bytes'] else float('nan')
+            print(f"{key[0]:>10} {key[1]:<24} {wall:>8.2f} {peak:>8.2f}")
+
+def write_autoencoder(file, input_dim=9, seed=0):
+    # Random weights in Scorer's format, shaped like Autoencoder.py's tied model
+    rng = np.random.default_rng(seed)
+    hidden_dim, latent_dim = input_dim - 1, int(np.ceil(input_dim / 2))
+    arrays = {
+        'kernel_0': rng.normal(0, 0.3, (input_dim, hidden_dim)).astype(np.float32),
+        'bias_0': rng.normal(0, 0.1, hidden_dim).astype(np.float32),
+        'kernel_1': rng.normal(0, 0.3, (hidden_dim, latent_dim)).astype(np.float32),
+        'bias_1': rng.normal(0, 0.1, latent_dim).astype(np.float32),
+        'bias_2': rng.normal(0, 0.1, hidden_dim).astype(np.float32),
+        'bias_3': rng.normal(0, 0.1, input_dim).astype(np.float32),
+    }
+    layers = [{'kind': 'dense', 'activation': 'leaky_relu', 'alpha': 0.3},
+              {'kind': 'dense', 'activation': 'leaky_relu', 'alpha': 0.3},
+              {'kind': 'transpose', 'tied': 1, 'activation': 'leaky_relu', 'alpha': 0.3},
+              {'kind': 'transpose', 'tied': 0, 'activation': 'leaky_relu', 'alpha': 0.3}]
+    np.savez(file, config=np.array(json.dumps(layers)), **arrays)
+
+# Start-up (fresh interpreter: imports, loading the model, first prediction) of each scoring path
+scorer_startup = {
+    'numpy': "from Scorer import Scorer; import numpy as np; "
+             "Scorer.load({file!r}).predict(np.zeros((1, {dim}))).sum()",
+    'keras': "import numpy as np; from tensorflow.keras.models import load_model; "
+             "load_model({model!r}, compile=False).predict(np.zeros((1, {dim})), verbose=0)",
+}
+
+def random_autoencoder(input_dim=9, number=16, seed=0):
+    # Autoencoder.py model with random weights (biases too, so a misplaced one shows)
+    from Autoencoder import build_autoencoder, configurations
+    rng = np.random.default_rng(seed)
+    autoencoder = build_autoencoder(input_dim, **configurations()[number])
+    autoencoder.set_weights([w + rng.normal(0, 0.1, w.shape).astype(w.dtype) for w in autoencoder.get_weights()])
+    return autoencoder
+
+def bench_export(numbers=range(1, 17), input_dim=9, rows=10**4, seed=0):
+    # Scorer.predict against autoencoder.predict for every configuration, exported as
+    # Loader.py does it: from the SavedModel, revived without custom_objects
+    if importlib.util.find_spec('tensorflow') is None:
+        print("export check: TensorFlow not installed")
+        return
+    from Autoencoder import model_name
+    from Loader import load_scorer
+    X = np.random.default_rng(seed).normal(0, 10, (rows, input_dim))
+    with tempfile.TemporaryDirectory() as tmp:
+        for number in numbers:
+            autoencoder = random_autoencoder(input_dim, number, seed)
+            model_file = os.path.join(tmp, model_name(number))
+            autoencoder.save(model_file)
+            expected = autoencoder.predict(X, verbose=0)
+            diff = np.max(np.abs(load_scorer(model_file).predict(X) - expected))
+            assert diff <= 1e-5 * max(1, np.max(np.abs(expected))), (number, diff)
+            print(f"model {number}: max diff {diff:.2e}")
+
+def bench_scorer(sizes=(10**3, 10**5, 10**6), input_dim=9, batch_size=32):
+    # NumPy scorer vs Keras predict (if TensorFlow is installed): start-up and rows/second
+    keras = importlib.util.find_spec('tensorflow') is not None
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'weights.npz')
+        model_file = os.path.join(tmp, 'model.tf')
+        model = None
+        if keras:
+            # Model 16 (tied, LeakyReLU) and its export
+            from Scorer import export_weights
+            model = random_autoencoder(input_dim)
+            model.save(model_file)
+            export_weights(model, file)
+        else:
+            write_autoencoder(file, input_dim)
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name, code in scorer_startup.items():
+            if name == 'keras' and not keras:
+                print(f"{name} start-up: TensorFlow not installed")
+                continue
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', code.format(file=file, model=model_file, dim=input_dim)],
+                           cwd=here, check=True)
+            print(f"{name} start-up: {time.perf_counter() - start:.3f} s")
+        scorer = Scorer.load(file)
+        print(f"{'rows':>10} {'numpy rows/s':>14} {'keras rows/s':>14} {'max diff':>10}")
+        rng = np.random.default_rng(0)
+        for rows in sizes:
+            X = rng.normal(0, 10, (rows, input_dim))
+            start = time.perf_counter()
+            predicted = scorer.predict(X)
+            numpy_rate = rows / (time.perf_counter() - start)
+            keras_rate, diff = float('nan'), float('nan')
+            if model is not None:
+                start = time.perf_counter()
+                expected = model.predict(X, batch_size=batch_size, verbose=0)
+                keras_rate = rows / (time.perf_counter() - start)
+                diff = np.max(np.abs(expected - predicted))
+            print(f"{rows:>10} {numpy_rate:>14.0f} {keras_rate:>14.0f} {diff:>10.2e}")
+
+def legacy_mal_subflows(columns, num_mal, pkts_sec=20, pkt_size_min=64, pkt_size_max=500):
+    # Loader.py's former generator: one pd.Series per gradient flood subflow
+    rows = []
+    step = np.floor((pkt_size_max - pkt_size_min) / num_mal)
+    pkt_size = pkt_size_min
+    for i in range(num_mal):
+        dur = 6
+        num_pkts = pkts_sec * dur
+        bits_sec = (pkt_size * num_pkts / 1e3 * 8) / dur
+        features = {'Pkts_Per_Sec': pkts_sec, 'KBits_Per_Sec': bits_sec}
+        group_values = {'Pkt_Size': pkt_size, 'TCP_Flags': 0, 'TTL': 64}
+        for group in feature_groups(columns):
+            for stat in STATS:
+                features[group + '_' + stat] = 0 if stat == 'Std' else group_values[group]
+        features['Anomaly'] = 1
+        rows.append(pd.Series(features)[columns])
+        pkt_size += step
+    return pd.DataFrame(rows)
+
+def bench_anomalies(sizes=(10**3, 10**4, 10**6), legacy_max=10**4, groups=('Pkt_Size', 'TCP_Flags', 'TTL')):
+    # Loop of pd.Series vs vectorized profiles (same rows for the gradient flood)
+    columns = feature_columns(groups)
+    profiles = ('gradient', 'flood', 'low_and_slow', 'bursty')
+    print(f"{'rows':>10} {'legacy s':>10} {'vector s':>10} {'mixed s':>10} {'equal':>6}")
+    for rows in sizes:
+        legacy, equal = float('nan'), ''
+        start = time.perf_counter()
+        vector = anomaly_mix(columns, {'gradient': rows})
+        vector_s = time.perf_counter() - start
+        if rows <= legacy_max:
+            start = time.perf_counter()
+            expected = legacy_mal_subflows(columns, rows)
+            legacy = time.perf_counter() - start
+            equal = np.array_equal(expected.to_numpy(dtype=np.float64), vector.to_numpy(dtype=np.float64))
+        start = time.perf_counter()
+        anomaly_mix(columns, {profile: rows // len(profiles) for profile in profiles}, seed=0)
+        mixed = time.perf_counter() - start
+        print(f"{rows:>10} {legacy:>10.3f} {vector_s:>10.3f} {mixed:>10.3f} {str(equal):>6}")
+
+def training_input_run(file, mode, epochs=1, batch_size=32):
+    # One training run in this process; prints samples/second and peak RSS as JSON
+    from tensorflow import keras
+    start = time.perf_counter()
+    if mode == 'memory':
+        # Autoencoder.load_features
+        X = pd.read_csv(file)
+        X = X[X.columns[:-1]]
+        train_rows = split_rows(X.shape[0])
+        X_train, X_test = X.iloc[:train_rows], X.iloc[train_rows:]
+        dim = X.shape[1]
+    else:
+        if mode == 'memmap':
+            X_train, X_test = memmap_datasets(features_to_npy(file), batch_size)
+        else:
+            X_train, X_test = csv_datasets(file, batch_size)
+        dim = X_train.element_spec[0].shape[1]
+    load = time.perf_counter() - start
+    # Same shape as the autoencoder, without tensorflow_addons
+    model = keras.Sequential([keras.layers.Dense(dim - 1, activation='relu', input_shape=(dim,)),
+                              keras.layers.Dense(int(np.ceil(dim / 2)), activation='relu'),
+                              keras.layers.Dense(dim - 1, activation='relu'),
+                              keras.layers.Dense(dim)])
+    model.compile(loss='mean_squared_error', optimizer='adam')
+    start = time.perf_counter()
+    if mode == 'memory':
+        model.fit(X_train, X_train, epochs=epochs, batch_size=batch_size, shuffle=True,
+                  validation_data=(X_test, X_test), verbose=0)
+        samples = X_train.shape[0]
+    else:
+        model.fit(X_train, epochs=epochs, validation_data=X_test, verbose=0)
+        samples = split_rows(count_rows(file))
+    fit = time.perf_counter() - start
+    print(json.dumps({'load_s': load, 'samples_per_s': samples * epochs / fit,
+                      'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024}))
+
+def bench_training_input(sizes=(10**5, 10**6), input_dim=9, modes=('memory', 'memmap', 'csv'), seed=0):
+    # In-memory vs streamed training input: samples/second of one epoch and peak RSS,
+    # each mode in its own process (memmap includes the one-off .npy conversion in load s)
+    if importlib.util.find_spec('tensorflow') is None:
+        print("Training input: TensorFlow not installed")
+        return
+    rng = np.random.default_rng(seed)
+    here = os.path.dirname(os.path.abspath(__file__))
+    print(f"{'rows':>10} {'mode':<8} {'load s':>8} {'samples/s':>10} {'peak MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in sizes:
+            file = os.path.join(tmp, f'features_{rows}.csv')
+            df = pd.DataFrame(rng.lognormal(3, 1, (rows, input_dim)), columns=[f'feature_{i}' for i in range(input_dim)])
+            df['Anomaly'] = 0
+            df.to_csv(file, index=False)
+            del df
+            for mode in modes:
+                code = f"import Benchmark; Benchmark.training_input_run({file!r}, {mode!r})"
+                out = subprocess.run([sys.executable, '-c', code], cwd=here, check=True,
+                                     capture_output=True, text=True).stdout
+                result = json.loads(out.strip().splitlines()[-1])
+                print(f"{rows:>10} {mode:<8} {result['load_s']:>8.2f} {result['samples_per_s']:>10.0f} "
+                      f"{result['peak_rss_bytes'] / 2**20:>8.0f}")
+
+def bench_server(num_requests=40000, input_dim=9, max_batches=(1, 64, 1024), max_delay=0.002, connections=4,
+                 window=256):
+    # Scoring server (in its own process) under the load generator: throughput and
+    # latency percentiles, client-side and server-side, for several batch limits
+    import asyncio
+    from Server import load_test
+    here = os.path.dirname(os.path.abspath(__file__))
+    X = np.random.default_rng(0).normal(0, 10, (num_requests, input_dim))
+    print(f"{'max batch':>9} {'mean batch':>10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'server p99':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        file = os.path.join(tmp, 'weights.npz')
+        write_autoencoder(file, input_dim)
+        for max_batch in max_batches:
+            socket = os.path.join(tmp, f'score_{max_batch}.sock')
+            code = (f"import asyncio; from Server import ScoringServer; asyncio.run(ScoringServer({file!r}, "
+                    f"threshold=1.0, max_batch={max_batch}, max_delay={max_delay}).serve({socket!r}))")
+            server = subprocess.Popen([sys.executable, '-c', code], cwd=here, stdout=subprocess.DEVNULL)
+            try:
+                while not os.path.exists(socket):
+                    time.sleep(0.05)
+                result = asyncio.run(load_test(socket, X, connections, window))
+            finally:
+                server.terminate()
+                server.wait()
+            stats = result['server']
+            print(f"{max_batch:>9} {stats['mean_batch']:>10.1f} {result['throughput_per_s']:>8.0f} "
+                  f"{result['p50_ms']:>8.1f} {result['p99_ms']:>8.1f} {stats['p99_ms']:>10.1f}")
+
+if __name__ == "__main__":
+    bench_partition()
+    bench_windows()
+    bench_features()
+    bench_ingest()
+    bench_schema()
+    bench_parallel()
+    bench_stages()
+    bench_export()
+    bench_scorer()
+    bench_anomalies()
+    bench_training_input()
+    bench_server()
@@ -0,0 +1,91 @@
+import numpy as np
+import hashlib
+import json
+import os
+import shutil
+import time
+
+# On-disk cache of pipeline stages. Each entry is a directory of .npy column
+# files (memory-mapped on load) plus meta.json. Entry keys chain: a stage's key
+# hashes its parent stage's key with its own parameters, so changing a parameter
+# only invalidates the stages downstream of it.
+class Cache:
+    def __init__(self, root, max_bytes=8 * 2**30):
+        self.root = root
+        self.max_bytes = max_bytes # Least recently used entries are evicted past this
+        if not os.path.exists(root):
+            os.makedirs(root)
+    @staticmethod
+    def key(*parts):
+        return hashlib.sha256(json.dumps(parts, default=str).encode()).hexdigest()
+    @staticmethod
+    def sourceHash(file):
+        # Content hash of a capture file
+        digest = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(2**20), b''):
+                digest.update(block)
+        return digest.hexdigest()
+    def entryPath(self, stage, key):
+        return os.path.join(self.root, f"{stage}-{key[:32]}")
+    def entries(self):
+        # meta.json of every complete entry
+        metas = []
+        for name in os.listdir(self.root):
+            meta_file = os.path.join(self.root, name, 'meta.json')
+            if os.path.exists(meta_file):
+                with open(meta_file) as f:
+                    meta = json.load(f)
+                meta['path'] = os.path.join(self.root, name)
+                meta['used'] = os.path.getmtime(meta_file)
+                metas.append(meta)
+        return metas
+    def load(self, stage, key):
+        # Dict of memory-mapped arrays, or None on a miss
+        path = self.entryPath(stage, key)
+        meta_file = os.path.join(path, 'meta.json')
+        if not os.path.exists(meta_file):
+            return None
+        with open(meta_file) as f:
+            meta = json.load(f)
+        if meta['key'] != key:
+            return None
+        os.utime(meta_file) # Mark as recently used
+        # Files are numbered (column names are not always valid file names)
+        return {name: np.load(os.path.join(path, f"{i}.npy"), mmap_mode='r', allow_pickle=False)
+                for i, name in enumerate(meta['names'])}
+    def save(self, stage, key, arrays, source=None, source_hash=None):
+        path = self.entryPath(stage, key)
+        # Write into a temporary directory, then rename, so readers never see half an entry
+        tmp = f"{path}.tmp{os.getpid()}"
+        if os.path.exists(tmp):
+            shutil.rmtree(tmp)
+        os.makedirs(tmp)
+        size = 0
+        for i, (name, values) in enumerate(arrays.items()):
+            np.save(os.path.join(tmp, f"{i}.npy"), np.ascontiguousarray(values), allow_pickle=False)
+            size += values.nbytes
+        meta = {'stage': stage, 'key': key, 'names': list(arrays), 'source': source,
+                'source_hash': source_hash, 'bytes': size, 'created': time.time()}
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump(meta, f)
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.rename(tmp, path)
+        if source is not None:
+            self.dropStale(source, source_hash)
+        self.evict()
+    def dropStale(self, source, source_hash):
+        # Entries built from an older version of the same source file
+        for meta in self.entries():
+            if meta['source'] == source and meta['source_hash'] != source_hash:
+                shutil.rmtree(meta['path'], ignore_errors=True)
+    def evict(self):
+        # Remove least recently used entries until the cache fits in max_bytes
+        metas = sorted(self.entries(), key=lambda meta: meta['used'])
+        total = sum(meta['bytes'] for meta in metas)
+        for meta in metas:
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(meta['path'], ignore_errors=True)
+            total -= meta['bytes']
@@ -0,0 +1,181 @@
+import numpy as np
+import hashlib
+
+# Reconstruction-error calibration of a trained autoencoder, stored next to the model.
+# Holds exact running moments (count, mean, sum of squared deviations), min and max,
+# a log-spaced histogram (quantile summary), the exact errors of both tails (at most
+# max_tail each: beyond that thresholds are estimated from the histogram) and the
+# largest error below the upper one, so thresholds load instantly and can be updated as new clean
+# subflows arrive.
+
+def sd_threshold(errors, num_sd=3):
+    # Largest error within num_sd standard deviations of the mean, and the number of
+    # errors outside (as Loader.py computed with list comprehensions)
+    errors = np.asarray(errors, dtype=np.float64)
+    mean, sd = errors.mean(), errors.std()
+    inside = (errors > mean - num_sd * sd) & (errors < mean + num_sd * sd)
+    return errors[inside].max(), int((~inside).sum())
+
+def rows_hash(X):
+    # Fingerprint of the feature rows (clean subflows) a calibration covers
+    return hashlib.sha256(np.ascontiguousarray(X, dtype=np.float64)).hexdigest()
+
+def weights_hash(file):
+    # Fingerprint of the arrays of a weights export, not of the file bytes: np.savez
+    # stamps the time into the archive, so re-exporting the same weights changes those
+    digest = hashlib.sha256()
+    with np.load(file) as arrays:
+        for name in sorted(arrays.files):
+            array = arrays[name]
+            digest.update(f"{name}{array.dtype.str}{array.shape}".encode())
+            digest.update(np.ascontiguousarray(array))
+    return digest.hexdigest()
+
+class Calibration:
+    # Histogram bins: 10**MIN_EXP to 10**MAX_EXP, BINS_PER_DECADE per decade,
+    # plus one bin below and one above
+    BINS_PER_DECADE = 64
+    MIN_EXP = -9
+    MAX_EXP = 9
+    def __init__(self, model_hash=None, tail_sd=1.5, max_tail=10**5):
+        self.model_hash = model_hash # Weights the errors came from
+        self.tail_sd = tail_sd # Errors beyond mean +- tail_sd * sd are kept exactly,
+        self.max_tail = max_tail # the most extreme max_tail of them on each side
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0 # Sum of squared deviations from the mean
+        self.min = np.inf
+        self.max = -np.inf
+        self.histogram = np.zeros(self.BINS_PER_DECADE * (self.MAX_EXP - self.MIN_EXP) + 2, dtype=np.int64)
+        self.tail = np.zeros(0) # Sorted; every error >= tail_floor is in it
+        self.tail_floor = -np.inf
+        self.below_max = -np.inf # Largest error below tail_floor
+        self.head = np.zeros(0) # Sorted; every error <= head_ceiling is in it
+        self.head_ceiling = np.inf
+        self.rows_hash = None # Rows the errors came from (see rows_hash)
+    @property
+    def sd(self):
+        # Population standard deviation (as np.std)
+        return np.sqrt(self.m2 / self.count) if self.count else np.nan
+    def binIndex(self, errors):
+        with np.errstate(divide='ignore'):
+            scaled = (np.log10(errors) - self.MIN_EXP) * self.BINS_PER_DECADE
+        return np.clip(np.floor(scaled), -1, len(self.histogram) - 2).astype(np.int64) + 1
+    def binEdges(self):
+        # Lower edge of every histogram bin
+        exps = self.MIN_EXP + np.arange(len(self.histogram) - 1) / self.BINS_PER_DECADE
+        return np.concatenate([[-np.inf], 10.0 ** exps])
+    def update(self, errors):
+        # Add a batch of clean reconstruction errors
+        errors = np.asarray(errors, dtype=np.float64).ravel()
+        if len(errors) == 0:
+            return self
+        count, mean = len(errors), errors.mean()
+        deviations = errors - mean
+        m2 = np.multiply(deviations, deviations).sum()
+        if self.count == 0:
+            self.count, self.mean, self.m2 = count, mean, m2
+        else:
+            # Chan et al. pairwise merge of moments
+            total = self.count + count
+            delta = mean - self.mean
+            self.mean += delta * count / total
+            self.m2 += m2 + delta * delta * self.count * count / total
+            self.count = total
+        self.min = min(self.min, errors.min())
+        self.max = max(self.max, errors.max())
+        self.histogram += np.bincount(self.binIndex(errors), minlength=len(self.histogram))
+        # Upper tail: everything at or above the current floor
+        floor = self.mean + self.tail_sd * self.sd
+        # Earlier batches were only kept above their own floor
+        tail_floor = max(self.tail_floor, floor)
+        seen = np.concatenate([self.tail, errors])
+        below = seen[seen < tail_floor]
+        if len(below):
+            self.below_max = max(self.below_max, below.max())
+        self.tail = np.sort(seen[seen >= floor])
+        self.tail_floor = tail_floor
+        if len(self.tail) > self.max_tail:
+            # Largest dropped error: the floor moves just above it
+            cutoff = self.tail[-self.max_tail - 1]
+            self.tail = self.tail[self.tail > cutoff]
+            self.below_max = max(self.below_max, cutoff)
+            self.tail_floor = max(self.tail_floor, np.nextafter(cutoff, np.inf))
+        # Lower tail, likewise
+        ceiling = self.mean - self.tail_sd * self.sd
+        head = np.concatenate([self.head, errors])
+        self.head = np.sort(head[head <= ceiling])
+        self.head_ceiling = min(self.head_ceiling, ceiling)
+        if len(self.head) > self.max_tail:
+            cutoff = self.head[self.max_tail]
+            self.head = self.head[self.head < cutoff]
+            self.head_ceiling = min(self.head_ceiling, np.nextafter(cutoff, -np.inf))
+        return self
+    def quantile(self, q):
+        # Approximate quantile from the histogram (bin upper edge, within 1/BINS_PER_DECADE decade)
+        rank = np.ceil(q * self.count)
+        upper = np.append(self.binEdges()[1:], np.inf)
+        value = upper[np.searchsorted(np.cumsum(self.histogram), max(rank, 1))]
+        return float(np.clip(value, self.min, self.max))
+    def sdThreshold(self, num_sd=3):
+        # Largest error strictly within num_sd standard deviations of the mean, the number
+        # of errors outside, and whether both are exact (else estimated from the histogram)
+        low, high = self.mean - num_sd * self.sd, self.mean + num_sd * self.sd
+        below = self.tail[self.tail < high]
+        exact = True
+        if len(below) and below[-1] >= self.tail_floor:
+            threshold = below[-1]
+        elif self.below_max < high:
+            # No error from tail_floor up to high: the largest one below the floor
+            threshold = self.below_max if np.isfinite(self.below_max) else np.nan
+        else:
+            exact = False
+            # Upper edge of the highest non-empty bin below high
+            edges = self.binEdges()
+            filled = np.flatnonzero(self.histogram[:self.binIndex(np.array([high]))[0] + 1])
+            threshold = min(np.append(edges[1:], np.inf)[filled[-1]], high) if len(filled) else np.nan
+        if high >= self.tail_floor:
+            removed_high = len(self.tail) - len(below)
+        else:
+            exact = False
+            removed_high = int(self.histogram[self.binIndex(np.array([high]))[0]:].sum())
+        if low < self.min:
+            removed_low = 0
+        elif low <= self.head_ceiling:
+            removed_low = int(np.searchsorted(self.head, low, side='right'))
+        else:
+            exact = False
+            removed_low = int(self.histogram[:self.binIndex(np.array([low]))[0] + 1].sum())
+        return float(threshold), removed_high + removed_low, bool(exact)
+    def summary(self, sds=(1.64, 1.76, 2, 3), qs=(.5, .9, .95, .99, .999)):
+        return {
+            'count': self.count, 'mean': self.mean, 'sd': self.sd, 'min': self.min, 'max': self.max,
+            'sd_thresholds': {num_sd: self.sdThreshold(num_sd)[0] for num_sd in sds},
+            'quantiles': {q: self.quantile(q) for q in qs},
+        }
+    def save(self, file):
+        np.savez(file, model_hash=np.array(self.model_hash or ''), tail_sd=self.tail_sd, max_tail=self.max_tail,
+                 moments=np.array([self.count, self.mean, self.m2, self.min, self.max, self.tail_floor,
+                                   self.below_max, self.head_ceiling]),
+                 histogram=self.histogram, tail=self.tail, head=self.head, rows_hash=np.array(self.rows_hash or ''))
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as arrays:
+            calibration = cls(str(arrays['model_hash']) or None, float(arrays['tail_sd']))
+            if 'max_tail' in arrays:
+                calibration.max_tail = int(arrays['max_tail'])
+            moments = arrays['moments']
+            count, calibration.mean, calibration.m2, calibration.min, calibration.max, calibration.tail_floor = \
+                moments[:6]
+            calibration.count = int(count)
+            if len(moments) > 6:
+                calibration.below_max, calibration.head_ceiling = moments[6:]
+                calibration.head = arrays['head']
+            else:
+                # Written before these were kept: unknown
+                calibration.below_max, calibration.head_ceiling = np.nan, -np.inf
+            if 'rows_hash' in arrays:
+                calibration.rows_hash = str(arrays['rows_hash']) or None
+            calibration.histogram = arrays['histogram']
+            calibration.tail = arrays['tail']
+        return calibration
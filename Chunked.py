@@ -0,0 +1,84 @@
+import pandas as pd
+import numpy as np
+import os
+
+from Extractor import Extractor
+from Schema import CSV_DTYPES, HEADER_NA
+
+# Streaming counterpart of Extractor for captures too large for memory.
+# The CSV is read in chunks; packets of subflows that may still grow are carried
+# over to the next chunk and finished subflows are emitted as soon as they close.
+# Assumes the capture is in time order (as tshark writes it).
+class ChunkedExtractor(Extractor):
+    def __init__(self, path, file, method, chunksize=10**6, profiler=None, feature_groups=None, interval=5,
+                 timeout_interval=2, threshold=2):
+        self.chunksize = chunksize
+        self.carry = None # Packets of open subflows
+        super().__init__(path, file, method, profiler=profiler, feature_groups=feature_groups, interval=interval,
+                         timeout_interval=timeout_interval, threshold=threshold)
+    def load(self):
+        # Nothing is loaded up front
+        print(f"Streaming: {self.file} ({self.chunksize} rows per chunk)")
+    def readChunks(self, file=None):
+        # Same typed columns as Extractor.load
+        return pd.read_csv(self.path + (file or self.file), chunksize=self.chunksize, dtype=CSV_DTYPES,
+                           na_values=HEADER_NA, float_precision='round_trip')
+    def processChunk(self, chunk, final=False):
+        # Returns the features of subflows closed by this chunk
+        self.df = chunk
+        self.dropNaN()
+        self.convertColumns()
+        df = self.df[self.id_cols + self.raw_cols]
+        if self.carry is not None:
+            df = pd.concat([self.carry, df], ignore_index=True)
+        else:
+            df = df.reset_index(drop=True)
+        self.df = df
+        self.partitionFlows()
+        self.findIndices()
+        self.partitionSubflows()
+        store = self.store
+        offsets = self.subflow_offsets
+        num_pkts = np.diff(offsets)
+        # Only the last subflow of each flow can still receive packets
+        flows = store.flowOf(offsets[:-1])
+        still_open = np.append(flows[1:] != flows[:-1], True) if len(flows) else np.zeros(0, dtype=bool)
+        if final:
+            still_open[:] = False
+        elif len(flows):
+            times = store.columns['frame.time_epoch']
+            latest = times.max() # Later packets cannot arrive before this
+            if self.method == "timeout":
+                still_open &= (latest - times[offsets[1:] - 1]) / 1e9 <= self.timeout_interval
+            else:
+                still_open &= (latest - times[offsets[:-1]]) / 1e9 <= self.interval
+        # Carry open subflows into the next chunk
+        rows = store.labels[np.repeat(still_open, num_pkts)]
+        self.carry = df.iloc[np.sort(rows)]
+        # Emit closed subflows with enough packets
+        return self.subflowTable(~still_open & (num_pkts >= self.threshold))
+    def extractFeatures(self):
+        # Generator of feature tables, one per chunk
+        self.carry = None
+        chunks = self.readChunks()
+        chunk = next(chunks, None)
+        i = 0
+        while chunk is not None:
+            following = next(chunks, None)
+            print(f"Chunk {i}: {chunk.shape[0]} rows")
+            yield self.processChunk(chunk, final=following is None)
+            chunk = following
+            i += 1
+    def featuresToCSV(self):
+        # Features are appended as chunks finish (unshuffled)
+        print("Saving features to CSV...")
+        file = self.featuresPath()
+        if os.path.exists(file):
+            os.remove(file)
+        total = 0
+        header = True
+        for subflow_features in self.extractFeatures():
+            subflow_features.to_csv(file, mode='a', header=header, encoding="utf-8", index=False)
+            total += subflow_features.shape[0]
+            header = False
+        print(f"Saved {total} subflows to {file}", end="\n\n")
@@ -0,0 +1,171 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import io
+import json
+import os
+
+# Training input for the autoencoder. The in-memory path (Autoencoder.load_features)
+# reads the whole feature CSV. The streaming paths keep memory bounded by the shuffle
+# buffer and prefetch instead of the table size:
+#   - features_to_npy converts the feature CSV chunk by chunk (then only the rows
+#     appended since) to a .npy matrix that memmap_datasets reads in blocks of rows
+#     through a tf.data pipeline;
+#   - csv_datasets parses the CSV itself, in batches of lines on parallel calls.
+# Both keep the in-memory split: the first 80% of rows train (shuffled every epoch),
+# the last 20% validate (in order).
+
+def split_rows(num_rows, test_size=.2):
+    # Training rows of train_test_split(test_size=.2, shuffle=False): the first
+    # ones, and the last ceil(test_size * num_rows) for validation
+    return num_rows - int(np.ceil(test_size * num_rows))
+
+def count_rows(csv_file):
+    # Data rows of a CSV with a header (as to_csv writes it: one line per row)
+    with open(csv_file, 'rb') as f:
+        return sum(block.count(b'\n') for block in iter(lambda: f.read(2**24), b'')) - 1
+
+def csv_digest(f, end, size=2**16):
+    # Fingerprint of the last bytes before end: tells rows appended to a CSV from a rewrite
+    f.seek(max(end - size, 0))
+    return hashlib.sha256(f.read(end - f.tell())).hexdigest()
+
+def lines_end(f):
+    # Offset after the last complete line (a row still being appended is left for later)
+    end = f.seek(0, os.SEEK_END)
+    while end > 0:
+        f.seek(max(end - 2**16, 0))
+        block = f.read(end - f.tell())
+        if b'\n' in block:
+            return end - len(block) + block.rindex(b'\n') + 1
+        end -= len(block)
+    return 0
+
+def count_lines(f, begin, end):
+    f.seek(begin)
+    lines = 0
+    while begin < end:
+        block = f.read(min(end - begin, 2**24))
+        lines += block.count(b'\n')
+        begin += len(block)
+    return lines
+
+def grown_header(npy_file, min_rows, rows):
+    # Data offset of a .npy matrix of at least min_rows rows and its header for rows rows,
+    # if that fits in place (numpy pads the header for the row count to grow), else None
+    headers = {(1, 0): (np.lib.format.read_array_header_1_0, np.lib.format.write_array_header_1_0),
+               (2, 0): (np.lib.format.read_array_header_2_0, np.lib.format.write_array_header_2_0)}
+    with open(npy_file, 'rb') as f:
+        version = np.lib.format.read_magic(f)
+        if version not in headers:
+            return None
+        read, write = headers[version]
+        shape, fortran_order, dtype = read(f)
+        data = f.tell()
+    header = io.BytesIO()
+    write(header, {'descr': np.lib.format.dtype_to_descr(dtype), 'fortran_order': fortran_order,
+                   'shape': (rows,) + shape[1:]})
+    if fortran_order or shape[0] < min_rows or header.tell() != data:
+        return None
+    return data, header.getvalue()
+
+def features_to_npy(csv_file, npy_file=None, chunksize=10**6, dtype=np.float32):
+    # Feature columns (all but Anomaly) as a .npy matrix; float32 is what Keras trains on.
+    # The CSV bytes converted are recorded next to it (<npy_file>.json): rows appended
+    # since (e.g. by Incremental.py) are parsed and appended to the matrix in place, any
+    # other change to the CSV rewrites it
+    npy_file = npy_file or os.path.splitext(csv_file)[0] + '.npy'
+    if os.path.exists(npy_file) and os.path.getmtime(npy_file) >= os.path.getmtime(csv_file):
+        return npy_file
+    columns = list(pd.read_csv(csv_file, nrows=0).columns)
+    features = columns[:-1]
+    state_file = npy_file + '.json'
+    state = None
+    if os.path.exists(npy_file) and os.path.exists(state_file):
+        with open(state_file) as f:
+            state = json.load(f)
+    with open(csv_file, 'rb') as f:
+        end = lines_end(f)
+        header = None
+        if (state is not None and state['columns'] == columns and state['dtype'] == np.dtype(dtype).str
+                and state['offset'] <= end and csv_digest(f, state['offset']) == state['digest']):
+            begin, old_rows = state['offset'], state['rows']
+            new_rows = count_lines(f, begin, end)
+            header = grown_header(npy_file, old_rows, old_rows + new_rows)
+        if header is None:
+            f.seek(0)
+            begin, old_rows = len(f.readline()), 0
+            new_rows = count_lines(f, begin, end)
+        f.seek(begin)
+        chunks = pd.read_csv(f, header=None, names=columns, usecols=features, nrows=new_rows,
+                             chunksize=chunksize) if new_rows else []
+        if header is None:
+            tmp = npy_file + '.tmp'
+            matrix = np.lib.format.open_memmap(tmp, mode='w+', dtype=dtype, shape=(new_rows, len(features)))
+            start = 0
+            for chunk in chunks:
+                matrix[start:start + chunk.shape[0]] = chunk[features].to_numpy(dtype=dtype)
+                start += chunk.shape[0]
+            matrix.flush()
+            del matrix
+            os.replace(tmp, npy_file)
+        else:
+            # Rows first, then the shape that covers them (an interrupted append is
+            # overwritten next time)
+            data, header = header
+            with open(npy_file, 'r+b') as matrix:
+                matrix.seek(data + old_rows * len(features) * np.dtype(dtype).itemsize)
+                for chunk in chunks:
+                    matrix.write(np.ascontiguousarray(chunk[features].to_numpy(dtype=dtype)).tobytes())
+                matrix.truncate()
+                matrix.seek(0)
+                matrix.write(header)
+        state = {'columns': columns, 'dtype': np.dtype(dtype).str, 'rows': old_rows + new_rows,
+                 'offset': end, 'digest': csv_digest(f, end)}
+    tmp = state_file + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(state, f)
+    os.replace(tmp, state_file)
+    return npy_file
+
+def memmap_datasets(npy_file, batch_size=32, block_rows=2**14, shuffle_buffer=2**17, seed=None, test_size=.2):
+    # (training, validation) datasets of (X, X) batches read from a memory-mapped matrix.
+    # Training blocks are read in a new random order every epoch and their rows mixed
+    # in the shuffle buffer (spanning several blocks)
+    import tensorflow as tf
+    matrix = np.load(npy_file, mmap_mode='r')
+    num_rows, dim = matrix.shape
+    train_rows = split_rows(num_rows, test_size)
+    def read(begin, end):
+        return np.array(matrix[begin:end])
+    def rows(start, stop, shuffle):
+        begins = np.arange(start, stop, block_rows, dtype=np.int64)
+        blocks = tf.data.Dataset.from_tensor_slices((begins, np.minimum(begins + block_rows, stop)))
+        if shuffle:
+            blocks = blocks.shuffle(len(begins), seed=seed, reshuffle_each_iteration=True)
+        blocks = blocks.map(lambda begin, end: tf.ensure_shape(
+                                tf.numpy_function(read, [begin, end], tf.as_dtype(matrix.dtype)), [None, dim]),
+                            num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+        dataset = blocks.unbatch()
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        return dataset.batch(batch_size).map(lambda X: (X, X)).prefetch(tf.data.AUTOTUNE)
+    return rows(0, train_rows, True), rows(train_rows, num_rows, False)
+
+def csv_datasets(csv_file, batch_size=32, parse_lines=2**12, shuffle_buffer=2**17, seed=None, test_size=.2):
+    # (training, validation) datasets of (X, X) batches parsed straight from the feature CSV
+    import tensorflow as tf
+    num_cols = len(pd.read_csv(csv_file, nrows=0).columns)
+    train_rows = split_rows(count_rows(csv_file), test_size)
+    def parse(lines):
+        # All but the Anomaly column, as float32
+        columns = tf.io.decode_csv(lines, [[0.0]] * (num_cols - 1), select_cols=list(range(num_cols - 1)))
+        return tf.stack(columns, axis=1)
+    def rows(lines, shuffle):
+        lines = lines.batch(parse_lines).map(parse, num_parallel_calls=tf.data.AUTOTUNE, deterministic=not shuffle)
+        dataset = lines.unbatch()
+        if shuffle:
+            dataset = dataset.shuffle(shuffle_buffer, seed=seed, reshuffle_each_iteration=True)
+        return dataset.batch(batch_size).map(lambda X: (X, X)).prefetch(tf.data.AUTOTUNE)
+    lines = tf.data.TextLineDataset(csv_file).skip(1)
+    return rows(lines.take(train_rows), True), rows(lines.skip(train_rows), False)
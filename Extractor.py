@@ -2,277 +2,338 @@ import pandas as pd
 import numpy as np
 import os
 
+from Cache import Cache
+from FlowStore import FlowStore
+from Features import FEATURE_GROUPS, feature_columns, feature_groups, multi_segment_stats
+from Pcap import pcap_frame
+from Profile import profiled
+from Schema import CSV_DTYPES, HEADER_NA, PACKET_DTYPES, decode_distinct, epoch_ns, ip_strings, ip_to_uint32, to_uint
+
+def window_clock(times, offsets, interval):
+    # Running clock over all flows. Gaps past the interval are clipped (the packet is
+    # beyond any window either way) and flows are separated by such a gap, so the
+    # clock stays small and windows never cross flows.
+    # Valid for any interval up to this one, so it can be shared between resolutions.
+    limit = int(interval * 1e9)
+    gaps = np.minimum(np.diff(times, prepend=times[0]), limit + 1)
+    gaps[offsets[:-1]] = limit + 1
+    return np.cumsum(gaps)
+
+def interval_starts(times, offsets, interval, clock=None):
+    # Subflows hold packets at most interval seconds after their first packet.
+    # Times are ns and sorted within each flow.
+    if len(times) == 0:
+        return np.zeros(0, dtype=np.int64)
+    limit = int(interval * 1e9)
+    if clock is None:
+        clock = window_clock(times, offsets, interval)
+    # First packet past the window opened by each packet (binary search)
+    next_start = np.searchsorted(clock, clock + limit, side='right')
+    # Follow windows from the first packet
+    starts = []
+    start = 0
+    while start < len(times):
+        starts.append(start)
+        start = next_start[start]
+    return np.array(starts, dtype=np.int64)
+
+def timeout_starts(times, offsets, timeout, time_diffs=None):
+    # Subflows end when the next packet arrives more than timeout seconds later.
+    # Difference between any packet and the one before it (arrival time difference)
+    if time_diffs is None:
+        time_diffs = np.diff(times) / 1e9 # Convert to seconds
+    # Positions where the inter-arrival time is greater than the timeout interval
+    splits = np.flatnonzero(time_diffs > timeout) + 1
+    # Every flow also starts a new subflow
+    return np.union1d(offsets[:-1], splits)
+
+def prefix_sums(values):
+    # Exact running totals (prefix[i] is the sum of the first i values)
+    prefix = np.zeros(len(values) + 1, dtype=np.int64)
+    np.cumsum(values, out=prefix[1:])
+    return prefix
+
+def subflow_table(columns, offsets, feature_cols, prefixes=None, keep=None):
+    # Features of every subflow, or only of the subflows where keep is True.
+    # Subflow i owns packet rows offsets[i]:offsets[i+1] of columns.
+    # prefixes optionally holds prefix_sums of integer columns, shared between calls.
+    groups = feature_groups(feature_cols)
+    size_totals = None
+    if prefixes is not None and 'ip.len' in prefixes:
+        size_totals = prefixes['ip.len'][offsets[1:]] - prefixes['ip.len'][offsets[:-1]]
+    if keep is not None:
+        # Gather the packets of kept subflows (segments still tile the columns), so
+        # statistics are not computed for subflows that would be discarded
+        num_pkts = np.diff(offsets)
+        rows = np.repeat(keep, num_pkts)
+        used = ['frame.time_epoch', 'ip.len'] + [FEATURE_GROUPS[group] for group in groups]
+        columns = {col: columns[col][rows] for col in dict.fromkeys(used)}
+        offsets = np.zeros(keep.sum() + 1, dtype=np.int64)
+        np.cumsum(num_pkts[keep], out=offsets[1:])
+        if size_totals is not None:
+            size_totals = size_totals[keep]
+    num_pkts = np.diff(offsets)
+    # Calculate duration
+    times = columns['frame.time_epoch']
+    subflow_dur = (times[offsets[1:] - 1] - times[offsets[:-1]]) / 1e9 # seconds
+    subflow_dur = np.maximum(subflow_dur, 1)
+
+    # Subflow features
+    sub_features = {}
+    
+    # Packets per second
+    sub_features['Pkts_Per_Sec'] = num_pkts/subflow_dur
+    # KBits per second
+    pkt_sizes = columns['ip.len']
+    if size_totals is None:
+        size_totals = np.add.reduceat(pkt_sizes, offsets[:-1], dtype=np.int64) if len(pkt_sizes) else num_pkts
+    total_bytes = size_totals / 1e3 # Convert to KB
+    sub_features['KBits_Per_Sec'] = (total_bytes * 8)/subflow_dur # KB to KBit/s
+    
+    # Statistics of every feature group's packet column (e.g. Pkt_Size, TCP_Flags, TTL), fused
+    group_columns = [columns[FEATURE_GROUPS[group]] for group in groups]
+    totals = [size_totals if FEATURE_GROUPS[group] == 'ip.len' else None for group in groups]
+    for group, stats in zip(groups, multi_segment_stats(group_columns, offsets, totals)):
+        for stat, values in stats.items():
+            sub_features[group + '_' + stat] = values
+    
+    # No anomalies in nominal data
+    sub_features['Anomaly'] = np.zeros(len(num_pkts), dtype=np.int64)
+    
+    # Convert to dataframe
+    return pd.DataFrame(sub_features, columns=feature_cols)
+
 class Extractor:
-    def __init__(self, path, file, method):
-        print(f"Loading: {file}")
-        self.df = pd.read_csv(path+file)
+    def __init__(self, path, file, method, cache=None, profiler=None, feature_groups=None, interval=5,
+                 timeout_interval=2, threshold=2):
         self.path = path
         self.file = file
         self.method = method
-        self.threshold = 2 # Min packets for flow analysis 
+        self.cache = cache # Optional Cache of cleaned packets, flows, subflows and features
+        self.profiler = profiler # Optional Profiler recording every stage
+        self.threshold = threshold # Min packets for flow analysis 
+        self.interval = interval # Max subflow length in seconds ("interval")
+        self.timeout_interval = timeout_interval # Max seconds since last packet arrival ("timeout")
         # Ignoring source should improve DDoS detection
         self.id_cols = ['ip.dst', 'dstport', 'ip.proto']
-        self.feature_cols = ['Pkts_Per_Sec', 'KBits_Per_Sec', 
-                             'Pkt_Size_Avg', 'Pkt_Size_Std', 'Pkt_Size_Q1', 'Pkt_Size_Q2', 'Pkt_Size_Q3', 'Pkt_Size_Min', 'Pkt_Size_Max', 
-                             #'TCP_Flags_Avg', 'TCP_Flags_Std', 'TCP_Flags_Q1', 'TCP_Flags_Q2', 'TCP_Flags_Q3', 'TCP_Flags_Min', 'TCP_Flags_Max',
-                             #'TTL_Avg', 'TTL_Std', 'TTL_Q1', 'TTL_Q2', 'TTL_Q3', 'TTL_Min', 'TTL_Max', 
-                             'Anomaly']
+        self.raw_cols = ['frame.time_epoch', 'ip.len', 'ip.ttl', 'tcp.flags'] # Raw features
+        self.converted = False # pcap input is already clean and typed
+        # Statistics of these packet columns (see Features.FEATURE_GROUPS: 'Pkt_Size', 'TCP_Flags', 'TTL')
+        self.feature_groups = feature_groups or ['Pkt_Size']
+        self.feature_cols = feature_columns(self.feature_groups)
+        self.load()
+    @profiled
+    def load(self):
+        print(f"Loading: {self.file}")
+        if self.cache is not None:
+            self.source_hash = Cache.sourceHash(self.path+self.file)
+            packets = self.fromCache('packets')
+            if packets is not None:
+                labels = packets.pop('labels')
+                self.df = pd.DataFrame(packets, index=labels)
+                self.converted = True
+                return
+        if self.file.endswith(('.pcap', '.pcapng')):
+            # Read headers directly instead of a tshark CSV export
+            self.df = pcap_frame(self.path+self.file)
+            self.converted = True
+            return
+        # Typed columns; exact float parsing, so epochs match however the file is read
+        self.df = pd.read_csv(self.path+self.file, dtype=CSV_DTYPES, na_values=HEADER_NA,
+                              float_precision='round_trip')
+    def cacheKey(self, stage):
+        # A stage's key covers its own parameters and every upstream stage
+        if stage == 'packets':
+            return Cache.key(self.source_hash, PACKET_DTYPES)
+        if stage == 'flows':
+            return Cache.key(self.cacheKey('packets'), self.id_cols, self.raw_cols)
+        if stage == 'subflows':
+            window = self.timeout_interval if self.method == "timeout" else self.interval
+            return Cache.key(self.cacheKey('flows'), self.threshold, self.method, window)
+        return Cache.key(self.cacheKey('subflows'), self.feature_cols)
+    def fromCache(self, stage):
+        if self.cache is None:
+            return None
+        arrays = self.cache.load(stage, self.cacheKey(stage))
+        if arrays is not None:
+            print(f"Using cached {stage}")
+        return arrays
+    def toCache(self, stage, arrays):
+        if self.cache is not None:
+            self.cache.save(stage, self.cacheKey(stage), arrays, self.path+self.file, self.source_hash)
+    def stageCounts(self):
+        # Sizes of the tables built so far (see Profile.STAGE_ROWS)
+        counts = {}
+        if getattr(self, 'df', None) is not None:
+            counts['packets'] = len(self.df)
+        if hasattr(self, 'store'):
+            counts['flow_packets'] = int(self.store.offsets[-1])
+            counts['flows'] = len(self.store)
+        if hasattr(self, 'subflow_starts'):
+            counts['subflows'] = len(self.subflow_starts)
+        if hasattr(self, 'subflow_features'):
+            counts['features'] = len(self.subflow_features)
+        return counts
     def getSubflowFeatures(self):
         return self.subflow_features
     def getFlowInfo(self):
         # Number of subflows per flow
-        flow_num = [] 
-        for i in range(len(self.subflow_indices)):
-            flow_num.append(len(self.subflow_indices[i]))
-        flow_num = pd.Series(flow_num)
-        flow_keys = pd.Series(self.keys)
+        flow_starts = np.searchsorted(self.subflow_offsets, self.store.offsets)
+        flow_num = pd.Series(np.diff(flow_starts))
+        key_columns = dict(self.store.key_columns)
+        for col in ('ip.src', 'ip.dst'):
+            if col in key_columns:
+                key_columns[col] = ip_strings(key_columns[col])
+        flow_keys = pd.Series([list(key) for key in zip(*key_columns.values())])
         flow_df = pd.DataFrame([flow_num,flow_keys]).T
         flow_df.columns = ['Num Subflows', 'Flow ID']
         return flow_df
+    def getSubflowIndices(self):
+        # (start, end) packet labels of each flow's subflows
+        labels = self.store.labels
+        bounds = zip(labels[self.subflow_offsets[:-1]], labels[self.subflow_offsets[1:] - 1])
+        flow_starts = np.searchsorted(self.subflow_offsets, self.store.offsets)
+        subflow_indices = []
+        for num in np.diff(flow_starts):
+            subflow_indices.append([next(bounds) for j in range(num)])
+        return subflow_indices
+    @profiled
     def dropNaN(self):
         print("Cleaning data...")
+        if self.converted:
+            return
         df = self.df
         # NAN values
+        # Invalid rows from concatenation of CSV files are read as NaN (see Schema.HEADER_NA)
         df.dropna(subset=['ip.proto'], inplace=True) # Drop non-IP packets
-        df.fillna(0, inplace=True) # Remaining values can be 0
-        # Invalid rows are from concatenation of CSV files
-        errorneous_indices = df[df['ip.len'] == 'ip.len'].index
-        df.drop(index=errorneous_indices, inplace=True)
+        # Remaining values can be 0 (filled by convertColumns)
+    @profiled
     def convertColumns(self):
         print("Converting column types...")
+        if self.converted:
+            return
         df = self.df  
-        id_cols = self.id_cols
-        # Numeric
-        df[['ip.len','ip.ttl']] = df[['ip.len','ip.ttl']].astype(int)
-        df['tcp.flags'] = df['tcp.flags'].astype(str).apply(int, base=16)
-        df['frame.time_epoch'] = pd.to_datetime(df['frame.time_epoch'], unit='s')   
-        # TCP or UDP ports
-        df['srcport'] = df[['tcp.srcport','udp.srcport']].astype(int).max(axis=1)
-        df['dstport'] = df[['tcp.dstport','udp.dstport']].astype(int).max(axis=1)
-        df.drop(['tcp.srcport','udp.srcport', 'tcp.dstport', 'udp.dstport'], axis=1, inplace=True)
-        # ID columns
-        # First convert ip proto to int (this prevents duplicates)
-        df['ip.proto'] = df['ip.proto'].astype(int)
-        df[id_cols] = df[id_cols].astype(str)
+        # Compact numeric columns (see Schema.PACKET_DTYPES), no object columns left
+        self.df = pd.DataFrame({
+            'frame.time_epoch': epoch_ns(df['frame.time_epoch']),
+            'ip.len': to_uint(df['ip.len'], np.uint16),
+            'ip.proto': to_uint(df['ip.proto'], np.uint8),
+            'ip.src': decode_distinct(df['ip.src'], ip_to_uint32, np.uint32),
+            'ip.dst': decode_distinct(df['ip.dst'], ip_to_uint32, np.uint32),
+            'ip.ttl': to_uint(df['ip.ttl'], np.uint8),
+            'tcp.flags': decode_distinct(df['tcp.flags'], lambda flags: int(flags, 16), np.uint16),
+            # TCP or UDP ports
+            'srcport': np.maximum(to_uint(df['tcp.srcport'], np.uint16), to_uint(df['udp.srcport'], np.uint16)),
+            'dstport': np.maximum(to_uint(df['tcp.dstport'], np.uint16), to_uint(df['udp.dstport'], np.uint16)),
+        }, index=df.index)
+        packets = {col: self.df[col].to_numpy() for col in self.df.columns}
+        packets['labels'] = self.df.index.to_numpy()
+        self.toCache('packets', packets)
+    @profiled
     def partitionFlows(self):
-        print("Partitioning by flow. This may take awhile...")
-        df = self.df
-        id_cols = self.id_cols
-        fid_frame = df[id_cols].drop_duplicates() # Need unique IDs
-        feature_cols = ['frame.time_epoch', 'ip.len', 'ip.ttl', 'tcp.flags'] # Raw features
-        # Partition by unique ID
-        partitions = []
-        for i in range(fid_frame.shape[0]):
-            # We must only select rows of our dataframe that match the unique ID 
-            next_fid = fid_frame.iloc[i] # Next unique ID
-            # Selection based on multiple column conditions being true (all ID columns must match)
-            conditions = None 
-            for j in range(len(id_cols)): 
-                if conditions is None: # First iteration doesn't need boolean operation
-                    conditions = (df[id_cols[j]] == next_fid[j])
-                else:
-                    conditions = conditions & (df[id_cols[j]] == next_fid[j])
-            # Select raw features from matching rows
-            partitions.append(df[conditions][feature_cols]) 
-        self.partitions = partitions
-        self.fid_frame = fid_frame
+        print("Partitioning by flow...")
+        flows = self.fromCache('flows')
+        if flows is not None:
+            self.store = FlowStore.fromArrays(flows)
+        else:
+            # Packets are stored once, grouped by flow
+            self.store = FlowStore.fromFrame(self.df, self.id_cols, self.raw_cols, sort_col='frame.time_epoch')
+            self.toCache('flows', self.store.toArrays())
+        self.fid_frame = self.store.keyFrame() # Unique IDs
+    @profiled
     def linkKeys(self):
         print("Linking keys to flows...")
-        fid_keys = self.fid_frame.values.tolist() # Convert fid_frame to keys
-        partitions = self.partitions
-        # Link IDs to partitions using a dictionary
-        fid_dict = {}
-        indices = []
-        for i in range(len(partitions)):
-            if partitions[i].shape[0] >= self.threshold: # Partition contains min number of packets
-                fid_dict[str(fid_keys[i])] = partitions[i]
-            else:
-                indices.append(i) # Otherwise we ignore this partition
-        self.fid_dict = fid_dict
-        # Get rid of extraneous keys (those linked to ignored partitions)
-        self.keys = [v for i,v in enumerate(fid_keys) if i not in indices]
+        # Ignore partitions without the min number of packets
+        self.store = self.store.select(self.store.counts() >= self.threshold)
+    @profiled
     def findIndices(self):
         print("Finding indices for subflows...")
-        if self.method == "timeout":
+        subflows = self.fromCache('subflows')
+        if subflows is not None:
+            self.subflow_starts = subflows['starts']
+        elif self.method == "timeout":
             self.findIndicesByTimeout()
         else:  
-            # Max subflow length in seconds (adjustable)
-            interval = 5
-            # 2D List of tuples (start and end indices) for each flow's subflows
-            subflow_indices = []
-            for i in range(len(self.keys)):
-                # Packets in this flow
-                flow_id = str(self.keys[i]) 
-                flow_pkts = self.fid_dict[flow_id] 
-                # Packet arrival times
-                flow_pkt_times = flow_pkts['frame.time_epoch']
-                start_index = flow_pkt_times.index[0]
-                index_tuples = []
-                while True:
-                    start_time = flow_pkt_times.loc[start_index]
-                    # Subtract start time from all subsequent packet times
-                    sub_frame = flow_pkt_times.loc[start_index:] - start_time
-                    sub_frame = sub_frame/np.timedelta64(1,'s') # Convert to seconds
-                    # See if we can split
-                    if (sub_frame > interval).sum() > 0:
-                        end_index = sub_frame[sub_frame <= interval].index[-1] # Last index <= interval
-                        index_tuples.append((start_index,end_index))
-                        start_index = sub_frame[sub_frame > interval].index[0] # First index > interval
-                    else:
-                        # The remaining flow is <= our interval
-                        end_index = sub_frame.index[-1] # Last index of sub frame
-                        index_tuples.append((start_index,end_index))
-                        break
-                # Subflow indices for this flow
-                subflow_indices.append(index_tuples) 
-            self.subflow_indices = subflow_indices
+            # Packet arrival times (ns)
+            times = self.store.columns['frame.time_epoch']
+            # Start position of every subflow, in flow order
+            self.subflow_starts = interval_starts(times, self.store.offsets, self.interval)
+        if subflows is None:
+            self.toCache('subflows', {'starts': self.subflow_starts})
     def findIndicesByTimeout(self):
-        timeout_interval = 2 # Max seconds since last packet arrival (adjustable)
-        subflow_indices = [] # 2D list containing subflow indices for each flow
-        for i in range(len(self.keys)):  
-            # Packets in this flow
-            flow_id = str(self.keys[i]) 
-            flow_pkts = self.fid_dict[flow_id] 
-            # Packet arrival times
-            flow_pkt_times = flow_pkts['frame.time_epoch']
-            # Difference between any row and the row before it (arrival time difference)
-            flow_time_diffs = flow_pkt_times.diff() 
-            flow_time_diffs = flow_time_diffs/np.timedelta64(1,'s') # Convert to seconds
-            # Indices where the inter-arrival time is greater than the timeout interval
-            subflow_indices.append(flow_time_diffs[flow_time_diffs > timeout_interval].index)
-        self.subflow_indices = subflow_indices
+        # Packet arrival times (ns)
+        times = self.store.columns['frame.time_epoch']
+        self.subflow_starts = timeout_starts(times, self.store.offsets, self.timeout_interval)
+    @profiled
     def partitionSubflows(self):
         print("Partitioning subflows...")
-        if self.method == "timeout":
-            self.partitionSubflowsByTimeout()
-        else:
-            subflows = []
-            for i in range(len(self.keys)):
-                # Packets in this flow
-                flow_id = str(self.keys[i])
-                pkt_list = self.fid_dict[flow_id] 
-                # Subflow intervals
-                for j in range(len(self.subflow_indices[i])):
-                    next_tuple = self.subflow_indices[i][j]
-                    subflow = pkt_list.loc[next_tuple[0]:next_tuple[1]]
-                    subflows.append(subflow)
-            self.subflows = subflows
-    def partitionSubflowsByTimeout(self):
-        subflows = []
-        for i in range(len(self.subflow_indices)):
-            # Packets in this flow
-            flow_id = str(self.keys[i])
-            pkt_list = self.fid_dict[flow_id] 
-            # Subflow intervals
-            start = pkt_list.index[0]
-            for j in range(len(self.subflow_indices[i])):
-                # The end of this list is the start of the next subflow, so it must be excluded
-                end = self.subflow_indices[i][j] 
-                subflows.append(pkt_list.loc[start:end][:-1]) # Exclude last row
-                start = end
-            # Final subflow for this flow
-            subflows.append(pkt_list.loc[start:])
-        self.subflows = subflows
+        # Subflows tile each flow, so subflow i owns rows subflow_offsets[i]:subflow_offsets[i+1]
+        self.subflow_offsets = np.append(self.subflow_starts, self.store.offsets[-1])
+    @profiled
     def extractSubflowFeatures(self):
         print("Extracting subflow features...")
-        subflow_features = []
-        for i in range(len(self.subflows)):
-            # Next subflow
-            subflow = self.subflows[i]
-            num_pkts = subflow.shape[0]
-            # Discard subflow if too few packets
-            if num_pkts < self.threshold: 
-                continue
-            # Calculate duration
-            start_time = subflow.iloc[0]['frame.time_epoch']
-            end_time = subflow.iloc[-1]['frame.time_epoch']
-            subflow_dur = end_time - start_time
-            subflow_dur = subflow_dur/np.timedelta64(1,'s') # seconds
-            if subflow_dur < 1:
-                subflow_dur = 1
-            
-            # Subflow features
-            sub_features = []
-            
-            # Packets per second
-            sub_features.append(num_pkts/subflow_dur)
-            # KBits per second
-            pkt_sizes = subflow['ip.len']
-            total_bytes = pkt_sizes.sum()
-            total_bytes /= 1e3 # Convert to KB
-            bits_sec = (total_bytes * 8)/subflow_dur # KB to KBit/s
-            sub_features.append(bits_sec)
-            
-            # Packet size statistics
-            sub_features.append(pkt_sizes.mean())
-            sub_features.append(pkt_sizes.std())
-            sub_features.append(pkt_sizes.quantile(.25))
-            sub_features.append(pkt_sizes.median())
-            sub_features.append(pkt_sizes.quantile(.75))
-            sub_features.append(pkt_sizes.min())
-            sub_features.append(pkt_sizes.max())
-            
-            '''
-            # TCP statistics
-            tcp_flags = subflow['tcp.flags']
-            sub_features.append(tcp_flags.mean())
-            sub_features.append(tcp_flags.std())
-            sub_features.append(tcp_flags.quantile(.25))
-            sub_features.append(tcp_flags.median())
-            sub_features.append(tcp_flags.quantile(.75))
-            sub_features.append(tcp_flags.min())
-            sub_features.append(tcp_flags.max())
-            
-            # TTL statistics
-            ttl = subflow['ip.ttl']
-            sub_features.append(ttl.mean())
-            sub_features.append(ttl.std())
-            sub_features.append(ttl.quantile(.25))
-            sub_features.append(ttl.median())
-            sub_features.append(ttl.quantile(.75))
-            sub_features.append(ttl.min())
-            sub_features.append(ttl.max())
-            '''
-           
-            # No anomalies in nominal data
-            sub_features.append(0)
-            
-            # Add sublist to main list
-            subflow_features.append(sub_features)
-        # Convert to dataframe
-        self.subflow_features = pd.DataFrame(subflow_features)
-        self.subflow_features.columns = self.feature_cols
+        features = self.fromCache('features')
+        if features is not None:
+            self.subflow_features = pd.DataFrame(features, columns=self.feature_cols)
+            return
+        # Discard subflows with too few packets
+        keep = np.diff(self.subflow_offsets) >= self.threshold
+        self.subflow_features = self.subflowTable(keep)
+        self.toCache('features', {col: self.subflow_features[col].to_numpy() for col in self.feature_cols})
+    def subflowTable(self, keep=None):
+        # Features of every subflow (or of those where keep is True)
+        return subflow_table(self.store.columns, self.subflow_offsets, self.feature_cols, keep=keep)
+    @profiled
+    def extractResolutions(self, resolutions):
+        # Features for several windows in one pass over the partitioned flows (after linkKeys).
+        # resolutions: (method, seconds) pairs, e.g. [("interval", 1), ("interval", 5), ("timeout", 2)]
+        print("Extracting subflow features at several resolutions...")
+        store = self.store
+        times = store.columns['frame.time_epoch']
+        offsets = store.offsets
+        # Shared by every resolution: one clock valid for the longest interval,
+        # inter-arrival times and exact packet size totals
+        intervals = [value for method, value in resolutions if method == "interval"]
+        clock = window_clock(times, offsets, max(intervals)) if intervals and len(times) else None
+        time_diffs = np.diff(times) / 1e9
+        prefixes = {'ip.len': prefix_sums(store.columns['ip.len'])}
+        self.resolution_features = {}
+        for method, value in resolutions:
+            if method == "timeout":
+                starts = timeout_starts(times, offsets, value, time_diffs)
+            else:
+                starts = interval_starts(times, offsets, value, clock)
+            subflow_offsets = np.append(starts, offsets[-1])
+            keep = np.diff(subflow_offsets) >= self.threshold
+            self.resolution_features[f"{method}_{value:g}"] = subflow_table(
+                store.columns, subflow_offsets, self.feature_cols, prefixes, keep)
+        return self.resolution_features
+    def resolutionsToCSV(self, features_file=None):
+        # One features file per resolution, labeled e.g. _features_interval_5.csv
+        print("Saving features to CSV...")
+        features_file = features_file or self.featuresPath()
+        for label, subflow_features in self.resolution_features.items():
+            file = features_file[:-4] + '_' + label + '.csv'
+            subflow_features.to_csv(file, encoding="utf-8", index=False)
+            print(f"{label}: {subflow_features.shape[0]} subflows")
+    @profiled
     def shuffleSubflows(self):
         self.subflow_features = self.subflow_features.sample(frac=1)
-    def featuresToCSV(self):
-        print("Saving features to CSV...")
-        path = self.path[0:-4]
-        path += 'features/'
+    def featuresPath(self):
+        # features/ next to the capture directory (e.g. .../csv/ -> .../features/)
+        path = os.path.join(os.path.dirname(os.path.normpath(self.path)), 'features', '')
         file = self.file.split('.')[0]+"_features.csv"
         if not os.path.exists(path):
             os.makedirs(path)
-        self.subflow_features.to_csv(path+file, encoding="utf-8", index=False)
+        return path+file
+    @profiled
+    def featuresToCSV(self):
+        print("Saving features to CSV...")
+        self.subflow_features.to_csv(self.featuresPath(), encoding="utf-8", index=False)
         print(self.subflow_features.info(), end="\n\n")
 
-# US Ignite data
-path = 'C:\\Users\\Michael\\Dropbox\\Backup\\Michael\\Shared\\Documents\\VTEC\\US Ignite\\csv\\'
-file = 'usignite_flows.csv' 
-
-method = "interval" #Options: "timeout" or "interval" (default/recommended)
-
-extractor = Extractor(path, file, method)
-
-extractor.dropNaN()
-extractor.convertColumns()
-extractor.partitionFlows()
-extractor.linkKeys()
-extractor.findIndices()
-extractor.partitionSubflows()
-extractor.extractSubflowFeatures()
-extractor.shuffleSubflows()
-extractor.featuresToCSV()
-
-# DEBUG
-
-feats = extractor.getSubflowFeatures()
-flows = extractor.getFlowInfo()
\ No newline at end of file
+if __name__ == "__main__":
+    # Extractor.py <capture.csv|.pcap> [extract options]: see Pipeline.py
+    import sys
+    from Pipeline import main
+    main(['extract', *sys.argv[1:]])
\ No newline at end of file
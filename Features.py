@@ -0,0 +1,102 @@
+import numpy as np
+
+# Vectorized statistics over segments (subflows) of packet columns.
+# Segment i covers rows offsets[i]:offsets[i+1]; every segment is non-empty.
+# Quartiles, min and max match numpy/pandas per-segment calls exactly, means of
+# integer columns too; float sums (std) agree to rounding (see Benchmark.bench_features).
+
+# Statistic suffixes, in feature column order
+STATS = ['Avg', 'Std', 'Q1', 'Q2', 'Q3', 'Min', 'Max']
+
+# Feature groups: statistics of one packet column, named <group>_<stat>
+FEATURE_GROUPS = {
+    'Pkt_Size': 'ip.len',
+    'TCP_Flags': 'tcp.flags',
+    'TTL': 'ip.ttl',
+}
+
+def feature_columns(groups):
+    # Subflow feature table columns for the selected groups
+    return (['Pkts_Per_Sec', 'KBits_Per_Sec'] + [group + '_' + stat for group in groups for stat in STATS]
+            + ['Anomaly'])
+
+def feature_groups(feature_cols):
+    # Groups present in a feature table, in column order
+    return [group for group in dict.fromkeys(col.rsplit('_', 1)[0] for col in feature_cols)
+            if group in FEATURE_GROUPS]
+
+def segment_ids(offsets):
+    return np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+
+def segment_sum(values, offsets):
+    # Float64 sum of each segment. Summed in order, where values[start:end].sum() sums
+    # pairwise: the two agree to rounding (a few ulps on long segments)
+    return np.add.reduceat(np.asarray(values, dtype=np.float64), offsets[:-1])
+
+def segment_sort(values, offsets):
+    # Sort values within each segment
+    seg = segment_ids(offsets)
+    if values.dtype.kind in 'ui' and len(values) and values.min() >= 0 and values.max() < 2**32:
+        # Small non-negative integers: one sort of packed (segment, value) keys
+        keys = (seg.astype(np.uint64) << np.uint64(32)) | values.astype(np.uint64)
+        keys.sort()
+        return (keys & np.uint64(0xFFFFFFFF)).astype(values.dtype)
+    return values[np.lexsort((values, seg))]
+
+def lerp(a, b, t):
+    # numpy's quantile interpolation
+    diff_b_a = b - a
+    interpolated = a + diff_b_a * t
+    return np.where(t >= 0.5, b - diff_b_a * (1 - t), interpolated)
+
+def segment_quantile(sorted_values, offsets, q):
+    # Linear interpolation quantile, as np.quantile / Series.quantile
+    counts = np.diff(offsets)
+    virtual = (counts - 1) * q
+    previous = np.floor(virtual)
+    gamma = virtual - previous
+    previous = previous.astype(np.int64)
+    following = np.minimum(previous + 1, counts - 1)
+    a = sorted_values[offsets[:-1] + previous].astype(np.float64)
+    b = sorted_values[offsets[:-1] + following].astype(np.float64)
+    return lerp(a, b, gamma)
+
+def segment_stats(values, offsets, totals=None):
+    # Mean, sample std, quartiles, min and max of every segment.
+    # Integer totals (exact, as float sums of integers below 2**53) may be passed in
+    counts = np.diff(offsets)
+    if totals is None:
+        totals = segment_sum(values, offsets)
+    mean = totals / counts
+    # Squared deviations from the mean, as pandas sums them
+    deviations = (np.repeat(mean, counts) - values) ** 2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std = np.sqrt(segment_sum(deviations, offsets) / (counts - 1))
+    sorted_values = segment_sort(values, offsets)
+    return {
+        'Avg': mean,
+        'Std': std,
+        'Q1': segment_quantile(sorted_values, offsets, .25),
+        'Q2': segment_quantile(sorted_values, offsets, .5),
+        'Q3': segment_quantile(sorted_values, offsets, .75),
+        'Min': sorted_values[offsets[:-1]].astype(np.int64),
+        'Max': sorted_values[offsets[1:] - 1].astype(np.int64),
+    }
+
+def multi_segment_stats(columns, offsets, totals=None):
+    # segment_stats of several columns over the same segments. Columns are stacked
+    # end to end (as segments of one array), so the sums, deviations and the sort
+    # run once for all of them. totals optionally holds exact totals per column (or None).
+    num_columns = len(columns)
+    num_values = offsets[-1]
+    starts = (offsets[:-1] + num_values * np.arange(num_columns)[:, None]).ravel()
+    stacked_offsets = np.append(starts, num_values * num_columns)
+    totals = list(totals) if totals is not None else [None] * num_columns
+    for i, column in enumerate(columns):
+        if totals[i] is None and column.dtype.kind in 'ui':
+            # Integer totals are exact
+            totals[i] = np.add.reduceat(column, offsets[:-1], dtype=np.int64) if len(column) else np.diff(offsets)
+    stacked_totals = np.concatenate(totals) if all(total is not None for total in totals) else None
+    stats = segment_stats(np.concatenate(columns), stacked_offsets, stacked_totals)
+    return [{stat: values.reshape(num_columns, -1)[i] for stat, values in stats.items()}
+            for i in range(num_columns)]
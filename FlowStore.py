@@ -0,0 +1,81 @@
+import pandas as pd
+import numpy as np
+
+# Flow registry in CSR layout: every packet is stored once, grouped by flow in
+# contiguous column arrays. Flow i owns rows offsets[i]:offsets[i+1].
+class FlowStore:
+    def __init__(self, key_columns, offsets, columns, labels):
+        self.key_columns = key_columns # ID column -> value per flow
+        self.offsets = offsets # Flow boundaries (num flows + 1)
+        self.columns = columns # Raw feature -> packet values (flow order)
+        self.labels = labels # Original packet labels (flow order)
+        self.key_index = None # Key -> flow id, built on first lookup
+    @classmethod
+    def fromFrame(cls, df, id_cols, value_cols, sort_col=None):
+        # Number every packet's flow in one hashing pass (flows numbered by first appearance)
+        flow_ids = df.groupby(id_cols, sort=False, dropna=False).ngroup().to_numpy()
+        # Group packets by flow, keeping capture order within each flow
+        order = np.argsort(flow_ids, kind='stable')
+        offsets = np.zeros(flow_ids.max() + 2 if len(flow_ids) else 1, dtype=np.int64)
+        np.cumsum(np.bincount(flow_ids), out=offsets[1:])
+        # Keys come from the first packet of each flow
+        first = order[offsets[:-1]]
+        if sort_col is not None:
+            # Order each flow by sort_col (captures are usually in order already)
+            values = df[sort_col].to_numpy()[order]
+            if values.dtype.kind == 'M':
+                values = values.view(np.int64)
+            in_order = np.diff(values) >= 0
+            in_order[offsets[1:-1] - 1] = True # Flow boundaries
+            if not in_order.all():
+                order = order[np.lexsort((values, flow_ids[order]))]
+        key_columns = {col: df[col].to_numpy()[first] for col in id_cols}
+        columns = {}
+        for col in value_cols:
+            values = df[col].to_numpy()
+            if values.dtype.kind == 'M': # Timestamps as int64 nanoseconds
+                values = values.view(np.int64)
+            columns[col] = values[order]
+        return cls(key_columns, offsets, columns, df.index.to_numpy()[order])
+    def toArrays(self):
+        # Flat dict of arrays (see Cache)
+        arrays = {'offsets': self.offsets, 'labels': self.labels}
+        arrays.update({'key:' + col: values for col, values in self.key_columns.items()})
+        arrays.update({'column:' + col: values for col, values in self.columns.items()})
+        return arrays
+    @classmethod
+    def fromArrays(cls, arrays):
+        key_columns = {name[4:]: values for name, values in arrays.items() if name.startswith('key:')}
+        columns = {name[7:]: values for name, values in arrays.items() if name.startswith('column:')}
+        return cls(key_columns, arrays['offsets'], columns, arrays['labels'])
+    def __len__(self):
+        return len(self.offsets) - 1
+    def counts(self):
+        # Packets per flow
+        return np.diff(self.offsets)
+    def flow(self, fid, col):
+        return self.columns[col][self.offsets[fid]:self.offsets[fid+1]]
+    def key(self, fid):
+        return tuple(values[fid] for values in self.key_columns.values())
+    def keys(self):
+        return list(zip(*self.key_columns.values()))
+    def index(self, key):
+        # Flow id for a key tuple (None if unknown)
+        if self.key_index is None:
+            self.key_index = {key: fid for fid, key in enumerate(self.keys())}
+        return self.key_index.get(tuple(key))
+    def flowOf(self, positions):
+        # Flow id owning each packet position
+        return np.searchsorted(self.offsets, positions, side='right') - 1
+    def keyFrame(self):
+        # Unique IDs indexed by the label of each flow's first packet
+        return pd.DataFrame(self.key_columns, index=self.labels[self.offsets[:-1]])
+    def select(self, mask):
+        # New store holding only the flows where mask is True
+        counts = self.counts()
+        rows = np.repeat(mask, counts)
+        offsets = np.zeros(mask.sum() + 1, dtype=np.int64)
+        np.cumsum(counts[mask], out=offsets[1:])
+        key_columns = {col: values[mask] for col, values in self.key_columns.items()}
+        columns = {col: values[rows] for col, values in self.columns.items()}
+        return FlowStore(key_columns, offsets, columns, self.labels[rows])
@@ -0,0 +1,138 @@
+import pandas as pd
+import numpy as np
+import fnmatch
+import json
+import os
+import time
+
+from Chunked import ChunkedExtractor
+from Schema import CSV_DTYPES
+
+# Incremental processing of a directory of captures (e.g. a tshark ring buffer).
+# Files are processed once, in name order, and their subflow features appended to
+# one feature store. A manifest records every processed file and where its
+# features start in the store; packets of subflows still open at the end of a
+# file are carried (on disk) into the next one, so flows may span files.
+class IncrementalExtractor(ChunkedExtractor):
+    def __init__(self, path, method, name='captures', pattern='*.csv', settle=60, chunksize=10**6,
+                 profiler=None, feature_groups=None, interval=5, timeout_interval=2, threshold=2):
+        self.pattern = pattern # Capture file names
+        self.settle = settle # Files modified less than this many seconds ago may still be written
+        super().__init__(path, name + '.csv', method, chunksize, profiler, feature_groups, interval, timeout_interval,
+                         threshold)
+        features_file = self.featuresPath()
+        self.features_file = features_file
+        self.manifest_file = features_file[:-4] + '_manifest.json'
+        self.carry_file = features_file[:-4] + '_carry.npz'
+        self.loadManifest()
+    def load(self):
+        print(f"Watching: {self.path}{self.pattern}")
+    def settings(self):
+        # Parameters the whole feature store must share
+        window = self.timeout_interval if self.method == "timeout" else self.interval
+        return {'method': self.method, 'window': window, 'threshold': self.threshold,
+                'id_cols': self.id_cols, 'feature_cols': self.feature_cols}
+    def loadManifest(self):
+        if not os.path.exists(self.manifest_file):
+            self.manifest = {'settings': self.settings(), 'files': [], 'feature_rows': 0, 'feature_bytes': 0}
+            self.carry = None
+            return
+        with open(self.manifest_file) as f:
+            self.manifest = json.load(f)
+        if self.manifest['settings'] != self.settings():
+            raise ValueError(f"{self.manifest_file} was built with {self.manifest['settings']}")
+        self.carry = None
+        if os.path.exists(self.carry_file):
+            with np.load(self.carry_file, allow_pickle=False) as arrays:
+                index = arrays['index']
+                self.carry = pd.DataFrame({col: arrays[col] for col in arrays.files if col != 'index'},
+                                          index=index, columns=self.id_cols + self.raw_cols)
+    def saveManifest(self):
+        # Carry first, then the manifest that refers to it; each replaced atomically
+        if self.carry is not None and len(self.carry):
+            tmp = self.carry_file[:-4] + '.tmp.npz'
+            np.savez(tmp, index=self.carry.index.to_numpy(),
+                     **{col: self.carry[col].to_numpy() for col in self.carry.columns})
+            os.replace(tmp, self.carry_file)
+        elif os.path.exists(self.carry_file):
+            os.remove(self.carry_file)
+        tmp = self.manifest_file + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.manifest, f, indent=1)
+        os.replace(tmp, self.manifest_file)
+    def pendingFiles(self):
+        # Unprocessed captures that are no longer being written, in name order
+        done = {entry['file'] for entry in self.manifest['files']}
+        now = time.time()
+        pending = []
+        for file in sorted(os.listdir(self.path)):
+            full = self.path + file
+            if (fnmatch.fnmatch(file, self.pattern) and file not in done and os.path.isfile(full)
+                    and now - os.path.getmtime(full) >= self.settle):
+                pending.append(file)
+        last = self.manifest['files'][-1]['file'] if self.manifest['files'] else None
+        if pending and last is not None and pending[0] < last:
+            print(f"Warning: {pending[0]} sorts before already processed {last}; "
+                  "subflows spanning it may be split")
+        return pending
+    def append(self, subflow_features):
+        # Append to the feature store, truncated first to the last recorded end
+        # (drops rows written by an interrupted run)
+        header = self.manifest['feature_bytes'] == 0
+        with open(self.features_file, 'a+b') as f:
+            f.truncate(self.manifest['feature_bytes'])
+        subflow_features.to_csv(self.features_file, mode='a', header=header, encoding="utf-8", index=False)
+        self.manifest['feature_rows'] += subflow_features.shape[0]
+        self.manifest['feature_bytes'] = os.path.getsize(self.features_file)
+    def processFile(self, file):
+        print(f"Processing: {file}")
+        start_rows, start_bytes = self.manifest['feature_rows'], self.manifest['feature_bytes']
+        num_pkts = 0
+        tables = []
+        for chunk in self.readChunks(file):
+            num_pkts += chunk.shape[0]
+            # Never final: the next file may continue any flow
+            tables.append(self.processChunk(chunk))
+        self.append(pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=self.feature_cols))
+        self.manifest['files'].append({
+            'file': file,
+            'bytes': os.path.getsize(self.path + file),
+            'mtime': os.path.getmtime(self.path + file),
+            'packets': num_pkts,
+            'feature_row': start_rows, # First feature row (and byte) written for this file
+            'feature_byte': start_bytes,
+            'subflows': self.manifest['feature_rows'] - start_rows,
+            'carried_packets': 0 if self.carry is None else len(self.carry),
+            'processed': time.time(),
+        })
+        self.saveManifest()
+    def update(self):
+        # Process every new capture; returns their names
+        pending = self.pendingFiles()
+        for file in pending:
+            self.processFile(file)
+        return pending
+    def watch(self, poll=60):
+        # Keep processing captures as they appear
+        while True:
+            if not self.update():
+                time.sleep(poll)
+    def flush(self):
+        # Close the carried subflows (end of collection)
+        if self.carry is None or len(self.carry) == 0:
+            return
+        print("Closing carried subflows...")
+        empty = pd.DataFrame({col: pd.Series(dtype=dtype) for col, dtype in CSV_DTYPES.items()})
+        self.append(self.processChunk(empty, final=True))
+        self.carry = None
+        self.saveManifest()
+    def featuresToCSV(self):
+        # The feature store is written as files are processed
+        self.update()
+
+if __name__ == "__main__":
+    # Incremental.py <directory of tshark CSV exports> [extract options]: processes
+    # captures as they appear (see Pipeline.py)
+    import sys
+    from Pipeline import main
+    main(['extract', '--watch', *sys.argv[1:]])
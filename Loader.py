@@ -1,166 +1,147 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from tensorflow.keras.layers import LeakyReLU
-from tensorflow.keras.models import load_model
-from sklearn.metrics import accuracy_score, confusion_matrix, recall_score, f1_score, precision_score
-from tensorflow_addons.optimizers import Lookahead
-from tensorflow.keras.optimizers import Adam
+import os
+import re
 
-# In[1]:
-# See Extractor.py
-print("Loading Features...")
+from Calibration import Calibration, rows_hash, weights_hash
+from Scorer import Scorer, export_weights
+
+# Evaluation of a trained autoencoder (see Autoencoder.py) on the clean subflows with
+# synthetic anomalies mixed in (see Anomalies.py). Scoring is NumPy only (Scorer.py);
+# TensorFlow is needed once per model to export its weights, and matplotlib/seaborn
+# only for the plots. Run through Pipeline.py (calibrate, score).
 
-path = 'C:\\Users\\Michael\\Dropbox\\Backup\\Michael\\Shared\\Documents\\VTEC\\US Ignite\\features\\'
-file = 'usignite_flows_features.csv'
-df = pd.read_csv(path+file)
-df.info()
+# In[1]:
 
-features = df.iloc[0:,:-1].columns
-target = ['Anomaly']
+def model_stem(model_name):
+    # Path the files kept next to a model are named from (models/m.tf/ -> models/m)
+    return os.path.splitext(os.path.normpath(model_name))[0]
+
+def model_files(model_name):
+    # NumPy export of the model (see Scorer.py) and its calibration (see Calibration.py)
+    stem = model_stem(model_name)
+    return stem + "_weights.npz", stem + "_calibration.npz"
+
+def load_scorer(model_name):
+    weights_file = model_files(model_name)[0]
+    if not os.path.exists(weights_file):
+        # Exported once; only this needs TensorFlow. Revived without custom_objects
+        # (compile=False: the optimizer is not needed), so DenseTranspose layers lose
+        # their activations: those of the numbered configuration are passed instead
+        from tensorflow.keras.models import load_model
+        activation = None
+        match = re.search(r'autoencoder_model_(\d+)_ddos', os.path.basename(os.path.normpath(model_name)))
+        if match:
+            from Autoencoder import layer_activations
+            activation = layer_activations(int(match.group(1)))
+        export_weights(load_model(model_name, compile=False), weights_file, activation)
+    return Scorer.load(weights_file) # Same predict() as the Keras model
+
+def calibrate(model_name, X_clean=None, autoencoder=None):
+    # Reconstruction errors of the clean subflows are summarised once per model and
+    # reloaded until the weights change. Given X_clean, only rows appended since the
+    # last calibration are scored and added; other subflows are calibrated afresh
+    weights_file, calibration_file = model_files(model_name)
+    autoencoder = autoencoder or load_scorer(model_name)
+    model_hash = weights_hash(weights_file)
+    calibration = Calibration.load(calibration_file) if os.path.exists(calibration_file) else None
+    if calibration is not None and calibration.model_hash != model_hash:
+        calibration = None
+    if X_clean is None:
+        if calibration is None:
+            raise ValueError(f"{calibration_file} is missing or stale; calibrate on clean subflows first")
+        return calibration
+    X_clean = np.asarray(X_clean, dtype=np.float64)
+    if calibration is not None and (calibration.count > X_clean.shape[0]
+                                    or calibration.rows_hash != rows_hash(X_clean[:calibration.count])):
+        calibration = None
+    calibration = calibration or Calibration(model_hash)
+    if X_clean.shape[0] > calibration.count:
+        calibration.update(autoencoder.errors(X_clean[calibration.count:]))
+        calibration.rows_hash = rows_hash(X_clean)
+        calibration.save(calibration_file)
+    return calibration
+
+def print_calibration(calibration, num_sd=3):
+    print("Reconstuction error threshold: ", calibration.max)
+    # '2*sd' = ~97.5%, '1.76 = ~96%', '1.64 = ~95%'
+    sd_threshold, removed, exact = calibration.sdThreshold(num_sd)
+    print(f"max value after removing {num_sd}*std:", sd_threshold, "" if exact else "(estimated)")
+    print("number of packets removed:", removed)
+    print("number of packets before removal:", calibration.count)
 
 # In[2]:
 
-# Anomaly generator
-def generate_mal_subflows(num_mal, pkts_sec, pkt_size_min, pkt_size_max, gradient):
-    mal_subflows = []
-    step = np.floor((pkt_size_max - pkt_size_min) / num_mal) if gradient else 0
-    pkt_size = pkt_size_min
-    for i in range(num_mal):
-        mal_subflows.append(mal_subflow(pkts_sec, pkt_size))
-        pkt_size += step
-    mal_subflows = pd.DataFrame(mal_subflows)
-    mal_subflows.columns = df.columns
-    # Concatenate normal subflows and malicious subflows
-    data = [df, mal_subflows]
-    return pd.concat(data).sample(frac=1) # Shuffle and return
-
-def mal_subflow(pkts_sec, pkt_size):
-    mal_features = []
-    dur = 6
-    num_pkts = pkts_sec * dur
-    
-    # Simple ICMP flood with same size packets (bytes)
-    total_size = pkt_size * num_pkts
-    total_size /= 1e3 # KB
-    bits_sec = (total_size * 8)/dur # KB to Kbits/s
-    
-    mal_features.append(pkts_sec)
-    mal_features.append(bits_sec)
-    mal_features.append(pkt_size) 
-    mal_features.append(0) # no standard deviation for uniform sizes
-    for i in range(5):
-        mal_features.append(pkt_size)
-    '''
-    # In an ICMP flood, TCP flags do not exist
-    for i in range(7):
-        mal_features.append(0)
-        
-    # Using arbitrary TTL for all packets in the flow
-    mal_features.append(64)
-    mal_features.append(0)
-    for i in range(5):
-        mal_features.append(64)
-    '''
-    mal_features.append(1) # Mark as anomaly
-    return pd.Series(mal_features)
-
-# Synthetic Flood Generation
-
-# Average Nominal: 5.93 KBit/s (@9.19 packets/sec)
-# Anomalies: 10.24 KBit/sec - 80 KBit/s (@20 packets/sec)
-pkts_sec = 20 
-pkt_size_min = 64 
-pkt_size_max = 500 # (65,535 bytes max in IPv4)
-
-# Number of malicious subflows to generate
-num_mal = np.ceil(df.shape[0] / 5).astype(int) # 20% of clean subflows
-
-# Gradient generates each flow using packet size between min and max
-# Otherwise all packets are minimum size
-# Note: Packet sizes are always equal in each synthetic flow
-gradient = True
-
-dirty_subflows = generate_mal_subflows(num_mal, pkts_sec, pkt_size_min, pkt_size_max, gradient)
-X = dirty_subflows[features]
-y = dirty_subflows[target]
+def detection_metrics(errors, labels, threshold):
+    # Accuracy, recall, precision and F1 of flagging errors above threshold
+    predicted = errors > threshold
+    labels = labels.astype(bool)
+    tp = np.sum(predicted & labels)
+    fp = np.sum(predicted & ~labels)
+    fn = np.sum(~predicted & labels)
+    precision = tp / (tp + fp) if tp + fp else 0.0
+    recall = tp / (tp + fn) if tp + fn else 0.0
+    return {
+        'accuracy': np.mean(predicted == labels),
+        'recall': recall,
+        'precision': precision,
+        'f1': 2 * precision * recall / (precision + recall) if precision + recall else 0.0,
+    }
+
+def confusion_matrix(errors, labels, threshold):
+    #   TN | FP
+    #   -------
+    #   FN | TP
+    predicted = (errors > threshold).astype(np.int64)
+    return np.bincount(2 * labels.astype(np.int64) + predicted, minlength=4).reshape(2, 2)
+
+def print_metrics(metrics):
+    print(" accuracy:  ", metrics['accuracy'])
+    print(" recall:    ", metrics['recall'])
+    print(" precision: ", metrics['precision'])
+    print(" f1-score:  ", metrics['f1'])
 
 # In[3]:
 
-# Load best model and find threshold
-# See models.txt
-model_name = "models\\autoencoder_model_16_ddos.tf"
-
-autoencoder = load_model(model_name)
-
-# If errors when loading, use custom object with load_model() 
-# custom_objects={"act1": LeakyReLU(), "act2": LeakyReLU(), "opt":Lookahead(Adam())}
-
-X_pred_clean = autoencoder.predict(df[features])
-clean_mae_loss = np.mean(np.abs(X_pred_clean - df[features]), axis=1)
-threshold = np.max(clean_mae_loss)
-print("Reconstuction error threshold: ", threshold)
-
-# Calculate threshold by accounting for standard deviation
-mean = np.mean(clean_mae_loss, axis=0)
-sd = np.std(clean_mae_loss, axis=0)
-num_sd = 3
-
-# '2*sd' = ~97.5%, '1.76 = ~96%', '1.64 = ~95%'
-final_list = [x for x in clean_mae_loss if (x > mean - num_sd * sd)] 
-final_list = [x for x in final_list if (x < mean + num_sd * sd)]
-sd_threshold = np.max(final_list)
-print("max value after removing 3*std:", sd_threshold)
-print("number of packets removed:", (len(clean_mae_loss) - len(final_list)))
-print("number of packets before removal:", len(clean_mae_loss))
-
-# In[4]:
-# Graph depicts threshold line and location of normal and malicious data
-X_pred = autoencoder.predict(X) 
-test_mae_loss = np.mean(np.abs(X_pred - X), axis=1)
- 
-data = [test_mae_loss, y]
-error_df_test = pd.concat(data, axis=1)
-error_df_test.columns=['Reconstruction_error','True_class']
-
-error_df_test = error_df_test.reset_index()
-
-groups = error_df_test.groupby('True_class')
-fig, ax = plt.subplots()
-
-for name, group in groups:
-    ax.plot(group.index, group.Reconstruction_error, 
-            marker='o', ms=3.5, linestyle='', 
-            label= "Anomaly" if name == 1 else "Normal") 
-ax.hlines(sd_threshold, ax.get_xlim()[0], ax.get_xlim()[1], colors="r", zorder=100, label='Threshold')
-    
-ax.legend()
-plt.title("Reconstruction error for different classes")
-plt.ylabel("Reconstruction error")
-plt.xlabel("Data point index")
-plt.show()
-
-# In[5]:
-# Confusion Matrix heat map
-
-pred_y = [1 if e > sd_threshold else 0 for e in error_df_test['Reconstruction_error'].values]
-conf_matrix = confusion_matrix(error_df_test['True_class'], pred_y) 
-plt.figure(figsize=(8, 6))
-sns.heatmap(conf_matrix,
-            xticklabels=["Normal","Anomaly"], 
-            yticklabels=["Normal","Anomaly"], 
-            annot=True, fmt="d");
-plt.title("Confusion matrix")
-plt.ylabel('True class')
-plt.xlabel('Predicted class')
-plt.show()
-
-#   TN | FP
-#   -------
-#   FN | TP
-
-print(" accuracy:  ", accuracy_score(error_df_test['True_class'], pred_y))
-print(" recall:    ", recall_score(error_df_test['True_class'], pred_y))
-print(" precision: ", precision_score(error_df_test['True_class'], pred_y))
-print(" f1-score:  ", f1_score(error_df_test['True_class'], pred_y))
\ No newline at end of file
+def plot_errors(errors, labels, threshold):
+    # Graph depicts threshold line and location of normal and malicious data
+    import matplotlib.pyplot as plt
+    error_df_test = pd.DataFrame({'Reconstruction_error': errors, 'True_class': labels})
+
+    groups = error_df_test.groupby('True_class')
+    fig, ax = plt.subplots()
+
+    for name, group in groups:
+        ax.plot(group.index, group.Reconstruction_error,
+                marker='o', ms=3.5, linestyle='',
+                label= "Anomaly" if name == 1 else "Normal")
+    ax.hlines(threshold, ax.get_xlim()[0], ax.get_xlim()[1], colors="r", zorder=100, label='Threshold')
+
+    ax.legend()
+    plt.title("Reconstruction error for different classes")
+    plt.ylabel("Reconstruction error")
+    plt.xlabel("Data point index")
+    plt.show()
+
+def plot_confusion(conf_matrix):
+    # Confusion Matrix heat map
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+    plt.figure(figsize=(8, 6))
+    sns.heatmap(conf_matrix,
+                xticklabels=["Normal","Anomaly"],
+                yticklabels=["Normal","Anomaly"],
+                annot=True, fmt="d");
+    plt.title("Confusion matrix")
+    plt.ylabel('True class')
+    plt.xlabel('Predicted class')
+    plt.show()
+
+if __name__ == "__main__":
+    # Loader.py <features.csv> <model.tf> [score options]: the former script, i.e.
+    # threshold from the clean subflows, then 20% gradient floods scored and plotted
+    import sys
+    from Pipeline import main
+    features_file, model_name = sys.argv[1:3]
+    main(['calibrate', '--features', features_file, '--model', model_name,
+          '+', 'score', '--anomalies', 'gradient=0.2', '--plot', *sys.argv[3:]])
\ No newline at end of file
@@ -0,0 +1,165 @@
+import pandas as pd
+import numpy as np
+import math
+import bisect
+from collections import OrderedDict
+
+from Features import feature_columns, lerp
+
+# Bounded quantile sketch: exact counts per distinct value until max_bins values
+# have been seen, then the two neighbouring bins spanning the narrowest range are
+# merged. A bin covers the values [lo, hi] it has absorbed (later values inside that
+# range join it) and is placed at their mean. Quartiles are exact while a subflow has
+# at most max_bins distinct packet sizes; past that each is within error() (the widest
+# bin's hi - lo) of the exact value. Packet sizes in a subflow rarely take more than a
+# few distinct values.
+class QuantileSketch:
+    __slots__ = ['bins', 'merged', 'max_bins']
+    def __init__(self, max_bins=64):
+        self.bins = {} # lo -> [hi, count, total]
+        self.merged = [] # Sorted lo of bins covering more than one value
+        self.max_bins = max_bins
+    def add(self, value):
+        bins = self.bins
+        bin = bins.get(value)
+        if bin is None and self.merged:
+            # Inside the range of a merged bin?
+            i = bisect.bisect_right(self.merged, value) - 1
+            if i >= 0 and value <= bins[self.merged[i]][0]:
+                bin = bins[self.merged[i]]
+        if bin is None:
+            bins[value] = [value, 1, value]
+            if len(bins) > self.max_bins:
+                self.merge()
+        else:
+            bin[1] += 1
+            bin[2] += value
+    def merge(self):
+        # Merge the neighbouring pair of bins that spans the narrowest range
+        los = sorted(self.bins)
+        his = [self.bins[lo][0] for lo in los]
+        i = int(np.argmin(np.subtract(his[1:], los[:-1])))
+        hi, count, total = self.bins.pop(los[i+1])
+        bin = self.bins[los[i]]
+        bin[0] = hi
+        bin[1] += count
+        bin[2] += total
+        self.merged = sorted(lo for lo, (hi, count, total) in self.bins.items() if hi > lo)
+    def error(self):
+        # Bound on the quantile error: 0 while every bin holds a single value
+        return max(hi - lo for lo, (hi, count, total) in self.bins.items())
+    def quantiles(self, qs):
+        # Linear interpolation quantiles (as np.quantile)
+        los = sorted(self.bins)
+        values = [self.bins[lo][2] / self.bins[lo][1] for lo in los] # Mean of each bin
+        ends = np.cumsum([self.bins[lo][1] for lo in los]) # Rank after each bin
+        n = ends[-1]
+        results = []
+        for q in qs:
+            virtual = (n - 1) * q
+            previous = math.floor(virtual)
+            following = min(previous + 1, n - 1)
+            a = values[np.searchsorted(ends, previous, side='right')]
+            b = values[np.searchsorted(ends, following, side='right')]
+            results.append(float(lerp(float(a), float(b), virtual - previous)))
+        return results
+
+# Running statistics of one open subflow
+class Subflow:
+    __slots__ = ['start', 'last', 'count', 'total', 'squares', 'min', 'max', 'sketch']
+    def __init__(self, time, max_bins):
+        self.start = time
+        self.last = time
+        self.count = 0
+        self.total = 0 # Exact integer sums
+        self.squares = 0
+        self.min = None
+        self.max = None
+        self.sketch = QuantileSketch(max_bins)
+    def add(self, time, length):
+        self.last = time
+        self.count += 1
+        self.total += length
+        self.squares += length * length
+        self.min = length if self.min is None else min(self.min, length)
+        self.max = length if self.max is None else max(self.max, length)
+        self.sketch.add(length)
+    def features(self):
+        # Same features as Extractor.extractSubflowFeatures
+        num_pkts = self.count
+        subflow_dur = (self.last - self.start) / 1e9 # seconds
+        if subflow_dur < 1:
+            subflow_dur = 1
+        mean = self.total / num_pkts
+        if num_pkts > 1:
+            std = math.sqrt((num_pkts * self.squares - self.total * self.total) / (num_pkts * (num_pkts - 1)))
+        else:
+            std = float('nan')
+        q1, q2, q3 = self.sketch.quantiles([.25, .5, .75])
+        bits_sec = ((self.total / 1e3) * 8)/subflow_dur # KB to KBit/s
+        return [num_pkts/subflow_dur, bits_sec, mean, std, q1, q2, q3, self.min, self.max, 0]
+
+# Online counterpart of Extractor: packets are pushed as they arrive (in time order)
+# and subflow features are emitted when a subflow closes.
+# State is one open subflow per active flow; idle flows are closed and dropped.
+class OnlineExtractor:
+    def __init__(self, method="interval", interval=5, timeout_interval=2, threshold=2, max_flows=10**6, max_bins=64,
+                 feature_groups=None):
+        if feature_groups is not None and list(feature_groups) != ['Pkt_Size']:
+            # A model trained on other groups would be fed mismatched columns
+            raise ValueError(f"OnlineExtractor computes Pkt_Size features only, not {', '.join(feature_groups)}")
+        self.method = method
+        self.interval = interval # Max subflow length in seconds ("interval")
+        self.timeout_interval = timeout_interval # Max seconds since last packet ("timeout")
+        self.threshold = threshold # Min packets per subflow
+        self.max_flows = max_flows # Oldest flows are closed early past this
+        self.max_bins = max_bins # Quartiles are exact up to this many distinct sizes per subflow
+        self.id_cols = ['ip.dst', 'dstport', 'ip.proto']
+        self.feature_cols = feature_columns(['Pkt_Size']) # Only packet sizes are tracked online
+        self.flows = OrderedDict() # Flow key -> open subflow, least recently active first
+    def closes(self, subflow, time):
+        # Whether a packet (or the clock) at this time ends the subflow
+        if self.method == "timeout":
+            return (time - subflow.last) / 1e9 > self.timeout_interval
+        return (time - subflow.start) / 1e9 > self.interval
+    def push(self, key, time, length):
+        # Add one packet (time in ns); returns features of subflows closed by it
+        closed = self.expire(time)
+        flows = self.flows
+        subflow = flows.get(key)
+        if subflow is not None and self.closes(subflow, time):
+            closed.append(subflow)
+            subflow = None
+        if subflow is None:
+            subflow = Subflow(time, self.max_bins)
+            flows[key] = subflow
+            if len(flows) > self.max_flows:
+                closed.append(flows.popitem(last=False)[1])
+        flows.move_to_end(key)
+        subflow.add(time, length)
+        return [s.features() for s in closed if s.count >= self.threshold]
+    def expire(self, time):
+        # Close idle flows; the least recently active are checked first
+        closed = []
+        flows = self.flows
+        # No later packet can join a subflow idle for longer than this
+        limit = self.timeout_interval if self.method == "timeout" else self.interval
+        while flows:
+            subflow = next(iter(flows.values()))
+            if (time - subflow.last) / 1e9 <= limit:
+                break
+            closed.append(flows.popitem(last=False)[1])
+        return closed
+    def pushFrame(self, df):
+        # Add a batch of converted packets (see Extractor.convertColumns)
+        rows = []
+        times = df['frame.time_epoch'].to_numpy().view(np.int64)
+        keys = zip(*(df[col].to_numpy() for col in self.id_cols))
+        for key, time, length in zip(keys, times.tolist(), df['ip.len'].tolist()):
+            rows.extend(self.push(key, time, length))
+        return pd.DataFrame(rows, columns=self.feature_cols)
+    def flush(self):
+        # Close every open subflow (end of capture)
+        closed = [s.features() for s in self.flows.values() if s.count >= self.threshold]
+        self.flows.clear()
+        return pd.DataFrame(closed, columns=self.feature_cols)
@@ -0,0 +1,112 @@
+import pandas as pd
+import numpy as np
+import multiprocessing as mp
+import os
+from multiprocessing import shared_memory
+
+from Extractor import Extractor, interval_starts, subflow_table, timeout_starts
+from Profile import profiled
+
+# Multi-core counterpart of Extractor. Flows are independent once packets are
+# partitioned, so after linkKeys they are sharded by key hash across worker
+# processes. The flow store's arrays are copied into shared memory once and
+# workers attach to them (nothing large is pickled). Each worker finds the
+# subflows of its flows and their features; shards are merged back into flow
+# order, so the results are identical to Extractor's for any number of workers.
+
+def share_arrays(arrays):
+    # Copy arrays into shared memory blocks; returns the blocks and their specs
+    blocks, specs = [], {}
+    for name, values in arrays.items():
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        blocks.append(block)
+        specs[name] = (block.name, values.shape, values.dtype.str)
+    return blocks, specs
+
+def attach_arrays(specs):
+    # Views of shared arrays (blocks must stay open while the views are used)
+    blocks, arrays = [], {}
+    for name, (block_name, shape, dtype) in specs.items():
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    return blocks, arrays
+
+def shard_flows(key_columns, num_shards):
+    # Flow ids of each shard; a flow's shard depends only on its key
+    hashes = pd.util.hash_pandas_object(pd.DataFrame(key_columns), index=False).to_numpy()
+    shards = hashes % np.uint64(num_shards)
+    return [np.flatnonzero(shards == i) for i in range(num_shards)]
+
+def shard_features(task):
+    # Subflow starts (global positions) and features of kept subflows for one shard
+    specs, flow_ids, method, window, threshold, feature_cols = task
+    blocks, arrays = attach_arrays(specs)
+    try:
+        offsets = np.array(arrays['offsets']) # Copy (small), so the block can be closed
+        counts = offsets[flow_ids + 1] - offsets[flow_ids]
+        # Packet positions of the shard's flows (flow order)
+        local_offsets = np.zeros(len(flow_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=local_offsets[1:])
+        rows = np.repeat(offsets[flow_ids] - local_offsets[:-1], counts) + np.arange(local_offsets[-1])
+        columns = {name[7:]: values[rows] for name, values in arrays.items() if name.startswith('column:')}
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+    times = columns['frame.time_epoch']
+    if method == "timeout":
+        starts = timeout_starts(times, local_offsets, window)
+    else:
+        starts = interval_starts(times, local_offsets, window)
+    subflow_offsets = np.append(starts, local_offsets[-1])
+    keep = np.diff(subflow_offsets) >= threshold
+    return rows[starts], keep, subflow_table(columns, subflow_offsets, feature_cols, keep=keep)
+
+class ParallelExtractor(Extractor):
+    def __init__(self, path, file, method, workers=None, cache=None, profiler=None, feature_groups=None, interval=5,
+                 timeout_interval=2, threshold=2):
+        self.workers = workers or os.cpu_count() # Worker processes (and shards)
+        self.shard_features = None # Merged features of the last sharded run
+        super().__init__(path, file, method, cache=cache, profiler=profiler, feature_groups=feature_groups,
+                         interval=interval, timeout_interval=timeout_interval, threshold=threshold)
+    @profiled
+    def findIndices(self):
+        # Subflows and their features are found together, one task per shard
+        subflows = self.fromCache('subflows')
+        if subflows is not None:
+            print("Finding indices for subflows...")
+            self.subflow_starts = subflows['starts']
+            self.shard_features = None
+            return
+        print(f"Finding subflows and features on {self.workers} workers...")
+        store = self.store
+        window = self.timeout_interval if self.method == "timeout" else self.interval
+        shared = {'offsets': store.offsets}
+        shared.update({'column:' + col: values for col, values in store.columns.items()})
+        blocks, specs = share_arrays(shared)
+        try:
+            tasks = [(specs, flow_ids, self.method, window, self.threshold, self.feature_cols)
+                     for flow_ids in shard_flows(store.key_columns, self.workers)]
+            with mp.Pool(self.workers) as pool:
+                results = pool.map(shard_features, tasks)
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+        # Deterministic merge: subflows in packet position order, as in the serial run
+        starts = np.concatenate([shard_starts for shard_starts, keep, features in results])
+        self.subflow_starts = np.sort(starts)
+        kept_starts = np.concatenate([shard_starts[keep] for shard_starts, keep, features in results])
+        features = pd.concat([features for shard_starts, keep, features in results], ignore_index=True)
+        self.shard_features = features.iloc[np.argsort(kept_starts)].reset_index(drop=True)
+        self.toCache('subflows', {'starts': self.subflow_starts})
+    @profiled
+    def extractSubflowFeatures(self):
+        if self.shard_features is None:
+            return super().extractSubflowFeatures()
+        print("Extracting subflow features...")
+        self.subflow_features = self.shard_features
+        self.shard_features = None
+        self.toCache('features', {col: self.subflow_features[col].to_numpy() for col in self.feature_cols})
@@ -0,0 +1,159 @@
+import pandas as pd
+import numpy as np
+import struct
+
+# Direct pcap/pcapng ingestion (no tshark CSV export).
+# The file is memory-mapped; only record boundaries are walked in Python, header
+# fields are gathered for all packets at once. Produces the columns of
+# Extractor.convertColumns (Schema.PACKET_DTYPES); non-IPv4 packets are dropped (as dropNaN).
+
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_IPV4 = 228
+
+def _records(data):
+    # Packet data offset, captured length, timestamp (ns) and link type of every record
+    magic = bytes(data[:4])
+    if magic == b'\x0a\x0d\x0d\x0a':
+        return _pcapng_records(data)
+    for endian in '<>':
+        (value,) = struct.unpack(endian + 'I', magic)
+        if value in (0xa1b2c3d4, 0xa1b23c4d):
+            break
+    else:
+        raise ValueError("Not a pcap or pcapng file")
+    frac_ns = 1 if value == 0xa1b23c4d else 1000 # Nanosecond or microsecond timestamps
+    linktype = struct.unpack_from(endian + 'I', data, 20)[0] & 0xFFFF
+    # Walk record boundaries (each record header gives the next record's offset)
+    incl_len = struct.Struct(endian + 'I')
+    buffer = memoryview(data)
+    starts = []
+    pos = 24
+    last = len(data) - 16
+    while pos <= last:
+        starts.append(pos + 16)
+        pos += 16 + incl_len.unpack_from(buffer, pos + 8)[0]
+    starts = np.array(starts, dtype=np.int64)
+    # Record headers (ts_sec, ts_frac, incl_len, orig_len) for all packets at once
+    headers = np.ascontiguousarray(data[starts[:, None] - 16 + np.arange(16)]).view(endian + 'u4')
+    headers = headers.astype(np.int64)
+    if pos > len(data): # Truncated last record
+        starts, headers = starts[:-1], headers[:-1]
+    times = headers[:, 0] * 10**9 + headers[:, 1] * frac_ns
+    linktypes = np.full(len(starts), linktype, dtype=np.int64)
+    return starts, headers[:, 2], times, linktypes
+
+def _tsresol_ns(ts, resol):
+    # if_tsresol: power of 10 (or of 2 with the high bit set) per second
+    if resol & 0x80:
+        return (ts * (10**9 / 2**(resol & 0x7F))).astype(np.int64)
+    if resol <= 9:
+        return ts * 10**(9 - resol)
+    return ts // 10**(resol - 9)
+
+def _pcapng_records(data):
+    starts, lengths, stamps, interfaces = [], [], [], []
+    linktypes, resols = [], [] # Per interface, reset by every section
+    sections = [] # First interface id of each section
+    endian = '<'
+    pos = 0
+    end = len(data)
+    while pos + 12 <= end:
+        block_type = struct.unpack_from(endian + 'I', data, pos)[0]
+        if block_type == 0x0A0D0D0A: # Section header, sets byte order
+            endian = '<' if struct.unpack_from('<I', data, pos + 8)[0] == 0x1A2B3C4D else '>'
+            sections.append(len(linktypes))
+        block_len = struct.unpack_from(endian + 'I', data, pos + 4)[0]
+        if block_len < 12 or pos + block_len > end:
+            break
+        if block_type == 1: # Interface description
+            linktypes.append(struct.unpack_from(endian + 'H', data, pos + 8)[0])
+            resol = 6
+            opt = pos + 16
+            while opt + 4 <= pos + block_len - 4:
+                code, length = struct.unpack_from(endian + 'HH', data, opt)
+                if code == 0:
+                    break
+                if code == 9: # if_tsresol
+                    resol = data[opt + 4]
+                opt += 4 + (length + 3) // 4 * 4
+            resols.append(resol)
+        elif block_type == 6: # Enhanced packet
+            iface, ts_high, ts_low, cap_len = struct.unpack_from(endian + 'IIII', data, pos + 8)
+            starts.append(pos + 28)
+            lengths.append(cap_len)
+            stamps.append(ts_high << 32 | ts_low)
+            interfaces.append(sections[-1] + iface)
+        pos += block_len
+    interfaces = np.array(interfaces, dtype=np.int64)
+    stamps = np.array(stamps, dtype=np.int64)
+    times = np.zeros(len(stamps), dtype=np.int64)
+    for i in range(len(linktypes)):
+        rows = interfaces == i
+        times[rows] = _tsresol_ns(stamps[rows], int(resols[i]))
+    linktypes = np.array(linktypes, dtype=np.int64)[interfaces] if len(interfaces) else interfaces
+    return np.array(starts, dtype=np.int64), np.array(lengths, dtype=np.int64), times, linktypes
+
+def _gather(data, positions, valid, size):
+    # Big-endian unsigned field at each position (0 where invalid)
+    value = np.zeros(len(positions), dtype=np.uint32)
+    rows = np.flatnonzero(valid)
+    for i in range(size):
+        value[rows] = (value[rows] << 8) | data[positions[rows] + i]
+    return value
+
+def read_pcap(file):
+    # Typed packet columns of a pcap/pcapng capture
+    data = np.memmap(file, dtype=np.uint8, mode='r')
+    starts, lengths, times, linktypes = _records(data)
+    ends = starts + lengths
+    # Link layer header length; Ethernet may carry (stacked) VLAN tags
+    ip = np.full(len(starts), -1, dtype=np.int64)
+    ip[(linktypes == LINKTYPE_RAW) | (linktypes == LINKTYPE_IPV4)] = 0
+    null = (linktypes == LINKTYPE_NULL) & (ends >= starts + 4)
+    ip[null] = 4 # BSD loopback (family checked with the IP version below)
+    sll = (linktypes == LINKTYPE_LINUX_SLL) & (ends >= starts + 16)
+    sll &= _gather(data, starts + 14, sll, 2) == 0x0800
+    ip[sll] = 16
+    ether = (linktypes == LINKTYPE_ETHERNET) & (ends >= starts + 14)
+    ethertype_at = starts + 12
+    for tag in range(2):
+        tagged = ether & np.isin(_gather(data, ethertype_at, ether, 2), (0x8100, 0x88a8))
+        tagged &= ends >= ethertype_at + 6
+        ethertype_at[tagged] += 4
+    ether &= _gather(data, ethertype_at, ether, 2) == 0x0800
+    ip[ether] = ethertype_at[ether] + 2 - starts[ether]
+    # IPv4 header
+    ip_at = starts + ip
+    is_ip = (ip >= 0) & (ends >= ip_at + 20)
+    is_ip &= _gather(data, ip_at, is_ip, 1) >> 4 == 4
+    rows = np.flatnonzero(is_ip)
+    ip_at, ends, times = ip_at[rows], ends[rows], times[rows]
+    valid = np.ones(len(rows), dtype=bool)
+    ihl = (_gather(data, ip_at, valid, 1) & 0x0F) * 4
+    proto = _gather(data, ip_at + 9, valid, 1)
+    first_fragment = (_gather(data, ip_at + 6, valid, 2) & 0x1FFF) == 0
+    # TCP/UDP header (first fragment only, as tshark)
+    l4_at = ip_at + ihl
+    tcp = (proto == 6) & first_fragment & (ends >= l4_at + 14)
+    udp = (proto == 17) & first_fragment & (ends >= l4_at + 4)
+    has_ports = tcp | udp
+    return {
+        'frame.time_epoch': times.view('datetime64[ns]'),
+        'ip.len': _gather(data, ip_at + 2, valid, 2).astype(np.uint16),
+        'ip.proto': proto.astype(np.uint8),
+        'ip.src': _gather(data, ip_at + 12, valid, 4),
+        'ip.dst': _gather(data, ip_at + 16, valid, 4),
+        'ip.ttl': _gather(data, ip_at + 8, valid, 1).astype(np.uint8),
+        'tcp.flags': (_gather(data, l4_at + 12, tcp, 2) & 0x0FFF).astype(np.uint16),
+        'srcport': _gather(data, l4_at, has_ports, 2).astype(np.uint16),
+        'dstport': _gather(data, l4_at + 2, has_ports, 2).astype(np.uint16),
+    }
+
+def pcap_frame(file):
+    # Packet table as Extractor.convertColumns leaves it
+    columns = read_pcap(file)
+    columns['frame.time_epoch'] = columns['frame.time_epoch'].view(np.int64)
+    return pd.DataFrame(columns)
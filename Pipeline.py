@@ -0,0 +1,390 @@
+import argparse
+import os
+import sys
+import time
+
+# Command line for the whole pipeline: extract, train, calibrate, score and benchmark.
+# Commands import what they use when they run, so extraction and NumPy scoring start
+# without TensorFlow, matplotlib or seaborn; plots are drawn only with --plot.
+# Commands chain with '+' in one process, each handing its results (feature table,
+# model, calibration) to the next in memory instead of through intermediate CSVs:
+#   python Pipeline.py extract csv/usignite_flows.csv + calibrate + score --anomalies gradient=0.2
+
+DEFAULT_MODEL = 'models/autoencoder_model_16_ddos.tf'
+
+# Captures read with Pcap.py rather than as tshark CSV
+PCAP = ('.pcap', '.pcapng')
+
+# Benchmark.py functions (bench_<name>), in the order `benchmark` runs them
+BENCHMARKS = ['partition', 'windows', 'features', 'ingest', 'schema', 'parallel', 'stages', 'export', 'scorer',
+              'anomalies', 'training_input', 'server']
+
+def features_table(args, context):
+    # The --features CSV, else the table (or file) the previous command produced
+    import pandas as pd
+    if args.features:
+        context['features'] = pd.read_csv(args.features)
+        context['features_file'] = args.features
+    elif context.get('features') is None:
+        if not context.get('features_file'):
+            raise SystemExit(f"{args.command}: no features; give --features or chain after extract")
+        context['features'] = pd.read_csv(context['features_file'])
+    return context['features']
+
+def features_file(args, context):
+    # Training paths that stream or append need the CSV itself
+    file = args.features or context.get('features_file')
+    if not file:
+        raise SystemExit(f"{args.command}: needs a features CSV (--features, or extract without --no-save)")
+    return file
+
+def model_path(args):
+    return os.path.join(args.models, '')
+
+def parse_resolutions(text):
+    # "interval:1,interval:5,timeout:2" -> [("interval", 1.0), ("interval", 5.0), ("timeout", 2.0)]
+    resolutions = []
+    for item in text.split(','):
+        method, _, seconds = item.partition(':')
+        try:
+            seconds = float(seconds)
+        except ValueError:
+            seconds = None
+        if method not in ('interval', 'timeout') or not seconds or seconds <= 0:
+            raise SystemExit(f"extract: bad resolution {item!r}; expected interval:<seconds> or timeout:<seconds>")
+        resolutions.append((method, seconds))
+    return resolutions
+
+def positive(convert):
+    # argparse type: convert, then require a value above 0
+    def parse(text):
+        value = convert(text)
+        if not value > 0:
+            raise argparse.ArgumentTypeError(f"must be greater than 0: {text}")
+        return value
+    parse.__name__ = convert.__name__ # For argparse's "invalid <type> value" message
+    return parse
+
+def check_extract(args):
+    # Options that would otherwise be silently ignored
+    directory = os.path.isdir(args.capture)
+    conflicts = [
+        (directory and args.cache, "--cache does not apply to a directory of captures"),
+        (directory and args.workers, "--workers does not apply to a directory of captures"),
+        (directory and args.resolutions, "--resolutions does not apply to a directory of captures"),
+        (directory and (args.out or args.no_save), "a directory's features go to its feature store"),
+        (not directory and args.watch, "--watch needs a directory of captures"),
+        (args.chunked and args.cache, "--cache does not apply to --chunked"),
+        (args.chunked and args.workers, "--workers does not apply to --chunked"),
+        (args.chunked and args.resolutions, "--resolutions does not apply to --chunked"),
+        (args.chunked and args.no_save, "--chunked writes its features as it goes"),
+        (args.workers and args.resolutions, "--workers does not apply to --resolutions"),
+        (args.chunked and args.capture.endswith(PCAP), "--chunked reads CSV captures only"),
+        (directory and args.pattern.endswith(PCAP), "a directory of captures must hold CSV captures"),
+        (args.resolutions and (args.interval is not None or args.timeout is not None),
+         "--resolutions sets the windows itself"),
+        (args.method == 'timeout' and args.interval is not None and not args.resolutions,
+         "--interval needs --method interval"),
+        (args.method == 'interval' and args.timeout is not None and not args.resolutions,
+         "--timeout needs --method timeout"),
+    ]
+    for conflict, message in conflicts:
+        if conflict:
+            raise SystemExit(f"extract: {message}")
+    if args.resolutions:
+        args.resolutions = parse_resolutions(args.resolutions)
+
+def window_options(args):
+    # Subflow settings given on the command line (else the extractors' defaults)
+    options = {'interval': args.interval, 'timeout_interval': args.timeout, 'threshold': args.threshold}
+    return {name: value for name, value in options.items() if value is not None}
+
+def extract(args, context):
+    from Profile import Profiler
+    profiler = Profiler(progress=args.progress) if args.profile else None
+    groups = args.groups.split(',')
+    windows = window_options(args)
+    if os.path.isdir(args.capture):
+        # Directory of captures: appended to one feature store as they appear
+        from Incremental import IncrementalExtractor
+        extractor = IncrementalExtractor(os.path.join(args.capture, ''), args.method, name=args.name,
+                                         pattern=args.pattern, settle=args.settle, chunksize=args.chunksize,
+                                         profiler=profiler, feature_groups=groups, **windows)
+        try:
+            if args.watch:
+                extractor.watch(args.poll)
+            else:
+                extractor.update()
+        finally:
+            # Also when --watch is interrupted
+            if profiler is not None:
+                profiler.save(extractor.features_file[:-4] + '_profile.json', file=args.capture, method=args.method)
+        stored = extractor.manifest['feature_rows'] > 0
+        context['features'], context['features_file'] = None, extractor.features_file if stored else None
+        return
+    path, file = os.path.split(args.capture)
+    path = os.path.join(path or '.', '')
+    out = args.out or os.path.splitext(args.capture)[0] + '_features.csv'
+    if args.chunked:
+        # Bounded memory: features are appended to out as chunks finish (unshuffled)
+        from Chunked import ChunkedExtractor
+        extractor = ChunkedExtractor(path, file, args.method, chunksize=args.chunksize, profiler=profiler,
+                                     feature_groups=groups, **windows)
+        if os.path.exists(out):
+            os.remove(out)
+        total = 0
+        for subflow_features in extractor.extractFeatures():
+            subflow_features.to_csv(out, mode='a', header=total == 0, encoding="utf-8", index=False)
+            total += subflow_features.shape[0]
+        print(f"Saved {total} subflows to {out}")
+        context['features'], context['features_file'] = None, out
+    else:
+        cache = None
+        if args.cache:
+            from Cache import Cache
+            cache = Cache(args.cache)
+        if args.workers:
+            from Parallel import ParallelExtractor
+            extractor = ParallelExtractor(path, file, args.method, workers=args.workers, cache=cache,
+                                          profiler=profiler, feature_groups=groups, **windows)
+        else:
+            from Extractor import Extractor
+            extractor = Extractor(path, file, args.method, cache=cache, profiler=profiler, feature_groups=groups,
+                                  **windows)
+        extractor.dropNaN()
+        extractor.convertColumns()
+        extractor.partitionFlows()
+        extractor.linkKeys()
+        if args.resolutions:
+            # One pass over the flows for every window; <out>_<method>_<seconds>.csv each
+            # (unshuffled). The first resolution goes on to chained commands
+            resolution_features = extractor.extractResolutions(args.resolutions)
+            label, features = next(iter(resolution_features.items()))
+            context['features'], context['features_file'] = features, None
+            if not args.no_save:
+                extractor.resolutionsToCSV(out)
+                context['features_file'] = out[:-4] + '_' + label + '.csv'
+            else:
+                for label, features in resolution_features.items():
+                    print(f"{label}: {features.shape[0]} subflows")
+        else:
+            extractor.findIndices()
+            extractor.partitionSubflows()
+            extractor.extractSubflowFeatures()
+            if args.shuffle:
+                extractor.shuffleSubflows()
+            features = extractor.getSubflowFeatures()
+            print(f"{features.shape[0]} subflows")
+            context['features'], context['features_file'] = features, None
+            if not args.no_save:
+                features.to_csv(out, encoding="utf-8", index=False)
+                print(f"Saved to {out}")
+                context['features_file'] = out
+    if profiler is not None:
+        profiler.save(os.path.splitext(out)[0] + '_profile.json', file=file, method=args.method)
+
+def train(args, context):
+    if args.sweep:
+        # All (or --configs) configurations in parallel worker processes
+        from Sweep import sweep
+        from Autoencoder import model_name
+        numbers = [int(number) for number in args.configs.split(',')] if args.configs else None
+        results = sweep(features_table(args, context), numbers, model_path(args), args.epochs or 700, args.batch_size,
+                        args.workers, args.threads, seed=args.seed)
+        print(results.to_string(index=False))
+        results.to_csv(model_path(args) + 'sweep.csv', index=False)
+        best = int(results.loc[results['f1'].idxmax(), 'model'])
+        context['model'] = model_path(args) + model_name(best)
+        return
+    from Autoencoder import fine_tune, model_name, plot_history, train_model
+    from Dataset import features_to_npy, memmap_datasets, split_rows
+    context['model'] = model_path(args) + model_name(args.config)
+    if args.refresh:
+        # Warm start on the rows added since the last training
+        print(fine_tune(features_file(args, context), args.config, model_path(args), nb_epoch=args.epochs or 50,
+                        patience=args.patience, batch_size=args.batch_size, seed=args.seed, min_rows=args.min_rows))
+        return
+    if args.streaming:
+        import numpy as np
+        npy_file = features_to_npy(features_file(args, context))
+        X_train, X_test = memmap_datasets(npy_file, args.batch_size, seed=args.seed)
+        trained_rows = np.load(npy_file, mmap_mode='r').shape[0]
+    else:
+        df = features_table(args, context)
+        X = df[df.columns[:-1]]
+        train_rows = split_rows(X.shape[0])
+        X_train, X_test, trained_rows = X.iloc[:train_rows], X.iloc[train_rows:], None
+    history = train_model(X_train, X_test, args.config, model_path(args), args.epochs or 700, args.batch_size,
+                          trained_rows)
+    if args.plot:
+        plot_history(history)
+
+def load_scorer(args, model):
+    from Loader import load_scorer, model_files
+    if not os.path.exists(model_files(model)[0]) and not os.path.exists(model):
+        raise SystemExit(f"{args.command}: no model {model} (train one, or give --model)")
+    return load_scorer(model)
+
+def calibrate(args, context):
+    from Loader import calibrate, print_calibration
+    model = args.model or context.get('model') or DEFAULT_MODEL
+    df = features_table(args, context)
+    scorer = load_scorer(args, model)
+    calibration = calibrate(model, df[df.columns[:-1]], scorer)
+    print_calibration(calibration, args.num_sd)
+    context.update(model=model, scorer=scorer, calibration=calibration)
+
+def parse_address(address):
+    # host:port, else a Unix socket path
+    host, _, port = address.rpartition(':')
+    return (host or '127.0.0.1', int(port)) if port.isdigit() else address
+
+def score(args, context):
+    from Loader import calibrate, model_files
+    model = args.model or context.get('model') or DEFAULT_MODEL
+    scorer = context['scorer'] if context.get('model') == model and context.get('scorer') else load_scorer(args, model)
+    calibration = context.get('calibration') if context.get('model') == model else None
+    try:
+        calibration = calibration or calibrate(model, autoencoder=scorer)
+    except ValueError as e:
+        raise SystemExit(f"score: {e}")
+    threshold = calibration.sdThreshold(args.num_sd)[0]
+    if args.serve:
+        import asyncio
+        from Server import ScoringServer
+        server = ScoringServer(model_files(model)[0], threshold=threshold, max_batch=args.max_batch,
+                               max_delay=args.max_delay)
+        try:
+            asyncio.run(server.serve(parse_address(args.serve)))
+        except KeyboardInterrupt:
+            print(server.metrics())
+        return
+    import numpy as np
+    import pandas as pd
+    df = features_table(args, context)
+    if args.anomalies:
+        # e.g. gradient=0.2,bursty=0.05: anomalies per clean subflow of each profile
+        from Anomalies import with_anomalies
+        counts = {profile: int(np.ceil(df.shape[0] * float(fraction)))
+                  for profile, fraction in (item.split('=') for item in args.anomalies.split(','))}
+        df = with_anomalies(df, counts, seed=args.seed)
+    errors = scorer.errors(df[df.columns[:-1]])
+    labels = df['Anomaly'].to_numpy()
+    flagged = errors > threshold
+    print(f"Scored {len(errors)} subflows: {flagged.sum()} above the threshold {threshold}")
+    if labels.any():
+        from Loader import confusion_matrix, detection_metrics, plot_confusion, plot_errors, print_metrics
+        conf_matrix = confusion_matrix(errors, labels, threshold)
+        print(conf_matrix)
+        print_metrics(detection_metrics(errors, labels, threshold))
+        if args.plot:
+            plot_errors(errors, labels, threshold)
+            plot_confusion(conf_matrix)
+    if args.out:
+        pd.DataFrame({'Reconstruction_error': errors, 'Flagged': flagged.astype(np.int64), 'Anomaly': labels}) \
+            .to_csv(args.out, index=False)
+    context['errors'] = errors
+
+def benchmark(args, context):
+    unknown = set(args.names) - set(BENCHMARKS)
+    if unknown:
+        raise SystemExit(f"benchmark: unknown {', '.join(sorted(unknown))}; choose from {', '.join(BENCHMARKS)}")
+    import Benchmark
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        getattr(Benchmark, 'bench_' + name)()
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='Pipeline.py', description="Subflow feature extraction and "
+                                     "autoencoder anomaly detection. Chain commands with '+'.")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('extract', help="Subflow features of a capture (tshark CSV or pcap)")
+    command.add_argument('capture', help="capture file, or a directory of CSV captures (incremental)")
+    command.add_argument('--method', choices=['interval', 'timeout'], default='interval')
+    command.add_argument('--interval', type=positive(float), help="max subflow length in seconds (default 5)")
+    command.add_argument('--timeout', type=positive(float), help="max seconds between packets with --method timeout (default 2)")
+    command.add_argument('--threshold', type=positive(int), help="min packets per subflow (default 2)")
+    command.add_argument('--resolutions', help="several windows in one pass, e.g. interval:1,interval:5,timeout:2")
+    command.add_argument('--groups', default='Pkt_Size', help="feature groups, e.g. Pkt_Size,TCP_Flags,TTL")
+    command.add_argument('--out', help="features CSV (default: <capture>_features.csv)")
+    command.add_argument('--no-save', action='store_true', help="keep the features in memory only")
+    command.add_argument('--no-shuffle', dest='shuffle', action='store_false')
+    command.add_argument('--workers', type=int, help="extract in this many processes")
+    command.add_argument('--chunked', action='store_true', help="stream the capture in chunks")
+    command.add_argument('--chunksize', type=int, default=10**6)
+    command.add_argument('--cache', help="cache directory for cleaned packets, flows and features")
+    command.add_argument('--profile', action='store_true', help="write <features>_profile.json")
+    command.add_argument('--progress', type=float, help="seconds between progress lines of long stages")
+    command.add_argument('--name', default='captures', help="feature store name (directory input)")
+    command.add_argument('--pattern', default='*.csv', help="capture file names (directory input)")
+    command.add_argument('--settle', type=float, default=60, help="seconds a capture must be unmodified")
+    command.add_argument('--watch', action='store_true', help="keep processing new captures")
+    command.add_argument('--poll', type=float, default=60)
+    command.set_defaults(run=extract, check=check_extract)
+
+    command = commands.add_parser('train', help="Train the autoencoder (TensorFlow)")
+    command.add_argument('--features', help="features CSV (default: from the previous command)")
+    command.add_argument('--models', default='models', help="model directory")
+    command.add_argument('--config', type=int, default=16, help="configuration 1-16 (Autoencoder.configurations)")
+    command.add_argument('--epochs', type=int, help="default 700, or 50 with --refresh")
+    command.add_argument('--batch-size', type=int, default=32)
+    command.add_argument('--streaming', action='store_true', help="stream features from a memory-mapped copy")
+    command.add_argument('--refresh', action='store_true', help="fine-tune on subflows added since last time")
+    command.add_argument('--patience', type=int, default=5, help="early stopping with --refresh")
+    command.add_argument('--min-rows', type=int, default=10, help="fewest new subflows to --refresh on")
+    command.add_argument('--sweep', action='store_true', help="train configurations in parallel")
+    command.add_argument('--configs', help="configurations to sweep, e.g. 1,8,16 (default all)")
+    command.add_argument('--workers', type=int)
+    command.add_argument('--threads', type=int, default=1, help="TensorFlow threads per sweep worker")
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--plot', action='store_true')
+    command.set_defaults(run=train)
+
+    command = commands.add_parser('calibrate', help="Threshold from the clean subflows' reconstruction errors")
+    command.add_argument('--features', help="clean features CSV (default: from the previous command)")
+    command.add_argument('--model', help=f"model (default: the trained one, else {DEFAULT_MODEL})")
+    command.add_argument('--num-sd', type=float, default=3)
+    command.set_defaults(run=calibrate)
+
+    command = commands.add_parser('score', help="Reconstruction errors and anomaly flags (NumPy)")
+    command.add_argument('--features', help="features CSV (default: from the previous command)")
+    command.add_argument('--model', help=f"model (default: the calibrated one, else {DEFAULT_MODEL})")
+    command.add_argument('--num-sd', type=float, default=3)
+    command.add_argument('--anomalies', help="add synthetic anomalies and report metrics, e.g. gradient=0.2")
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--out', help="CSV of errors and flags")
+    command.add_argument('--plot', action='store_true')
+    command.add_argument('--serve', help="run the scoring server on host:port or a Unix socket path")
+    command.add_argument('--max-batch', type=int, default=1024)
+    command.add_argument('--max-delay', type=float, default=0.002, help="seconds")
+    command.set_defaults(run=score)
+
+    command = commands.add_parser('benchmark', help="Run benchmarks (Benchmark.py)")
+    command.add_argument('names', nargs='*', metavar='name', help=f"any of {', '.join(BENCHMARKS)} (default all)")
+    command.set_defaults(run=benchmark)
+    return parser
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    parser = build_parser()
+    # Parse every command before running any
+    steps, step = [], []
+    for arg in argv + ['+']:
+        if arg == '+':
+            args = parser.parse_args(step)
+            if hasattr(args, 'check'):
+                args.check(args)
+            steps.append(args)
+            step = []
+        else:
+            step.append(arg)
+    context = {}
+    for args in steps:
+        start = time.perf_counter()
+        args.run(args, context)
+        print(f"{args.command}: {time.perf_counter() - start:.1f} s", file=sys.stderr)
+    return context
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+import functools
+import json
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+
+# Stage-level profiling of Extractor. Every stage method decorated with @profiled
+# is recorded by the extractor's Profiler (if any): wall and CPU time, peak RSS,
+# traced allocations, rows in and out, and flow/subflow counts before and after.
+
+# Table a stage reads and the one it writes (see Extractor.stageCounts)
+STAGE_ROWS = {
+    'load': (None, 'packets'),
+    'dropNaN': ('packets', 'packets'),
+    'convertColumns': ('packets', 'packets'),
+    'partitionFlows': ('packets', 'flow_packets'),
+    'linkKeys': ('flow_packets', 'flow_packets'),
+    'findIndices': ('flow_packets', 'subflows'),
+    'partitionSubflows': ('subflows', 'subflows'),
+    'extractSubflowFeatures': ('subflows', 'features'),
+    'extractResolutions': ('flow_packets', None),
+    'shuffleSubflows': ('features', 'features'),
+    'featuresToCSV': ('features', 'features'),
+}
+
+def _status_bytes(field):
+    # VmRSS/VmHWM from /proc (Linux), None elsewhere
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith(field + ':'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+def rss():
+    return _status_bytes('VmRSS')
+
+def peak_rss():
+    # Peak resident set size since the last reset_peak_rss (else since start)
+    peak = _status_bytes('VmHWM')
+    if peak is None:
+        scale = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is KB on Linux, bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+    return peak
+
+def reset_peak_rss():
+    # Linux only; otherwise peaks are since the process started
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+def profiled(method):
+    # Record a stage method in self.profiler
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        profiler = getattr(self, 'profiler', None)
+        if profiler is None:
+            return method(self, *args, **kwargs)
+        return profiler.run(self, method.__name__, lambda: method(self, *args, **kwargs))
+    return wrapper
+
+class Profiler:
+    def __init__(self, trace_memory=False, progress=None, out=sys.stderr):
+        self.trace_memory = trace_memory # tracemalloc allocated bytes (slows pandas down)
+        self.progress = progress # Seconds between progress lines of a running stage (None: quiet)
+        self.out = out
+        self.stages = []
+        self.depth = 0 # Stages called from other stages are part of the outer one
+    def run(self, extractor, name, call):
+        if self.depth:
+            return call()
+        self.depth += 1
+        before = extractor.stageCounts()
+        reset = reset_peak_rss()
+        if self.trace_memory:
+            tracing = tracemalloc.is_tracing()
+            if not tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            traced = tracemalloc.get_traced_memory()[0]
+        done = threading.Event()
+        start, cpu = time.perf_counter(), time.process_time()
+        if self.progress:
+            threading.Thread(target=self.report_progress, args=(name, start, done), daemon=True).start()
+        try:
+            return call()
+        finally:
+            wall, cpu = time.perf_counter() - start, time.process_time() - cpu
+            done.set()
+            self.depth -= 1
+            after = extractor.stageCounts()
+            rows_in, rows_out = STAGE_ROWS.get(name, (None, None))
+            record = {
+                'stage': name,
+                'wall_s': wall,
+                'cpu_s': cpu,
+                'peak_rss_bytes': peak_rss(),
+                'peak_rss_scope': 'stage' if reset else 'process',
+                'rss_bytes': rss(),
+                'allocated_bytes': None,
+                'peak_traced_bytes': None,
+                'rows_in': before.get(rows_in),
+                'rows_out': after.get(rows_out),
+                'before': before,
+                'after': after,
+            }
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['allocated_bytes'] = current - traced
+                record['peak_traced_bytes'] = peak - traced
+                if not tracing:
+                    tracemalloc.stop()
+            # Partitions discarded for having fewer than threshold packets
+            if name == 'linkKeys':
+                record['discarded_flows'] = before.get('flows', 0) - after.get('flows', 0)
+            if name == 'extractSubflowFeatures':
+                record['discarded_subflows'] = after.get('subflows', 0) - after.get('features', 0)
+            self.stages.append(record)
+            if self.progress:
+                print(f"{name}: done in {wall:.1f} s", file=self.out, flush=True)
+    def report_progress(self, name, start, done):
+        while not done.wait(self.progress):
+            current = rss()
+            memory = f", RSS {current / 2**20:.0f} MB" if current is not None else ""
+            print(f"{name}: {time.perf_counter() - start:.0f} s{memory}", file=self.out, flush=True)
+    def report(self, **info):
+        # Machine-readable summary; info (e.g. file, method) is stored alongside
+        return {**info, 'total_wall_s': sum(s['wall_s'] for s in self.stages),
+                'total_cpu_s': sum(s['cpu_s'] for s in self.stages),
+                'max_peak_rss_bytes': max((s['peak_rss_bytes'] or 0 for s in self.stages), default=None),
+                'stages': self.stages}
+    def save(self, report_file, **info):
+        with open(report_file, 'w') as f:
+            json.dump(self.report(**info), f, indent=1, default=int)
@@ -0,0 +1,62 @@
+import pandas as pd
+import numpy as np
+
+# Typed packet table. tshark CSV columns are declared at read time; repeated
+# strings (addresses, hex flags) are read as categoricals and decoded once per
+# distinct value. Small integers may be missing, so they are read as float32
+# (exact up to 2**24, and parsed much faster than nullable UInt16).
+CSV_DTYPES = {
+    'frame.time_epoch': 'float64',
+    'ip.len': 'float32',
+    'ip.proto': 'float32',
+    'ip.src': 'category',
+    'ip.dst': 'category',
+    'ip.ttl': 'float32',
+    'tcp.srcport': 'float32',
+    'tcp.dstport': 'float32',
+    'tcp.flags': 'category', # Hex strings, e.g. 0x0018
+    'udp.srcport': 'float32',
+    'udp.dstport': 'float32',
+}
+
+# Header rows left by concatenating CSV files read as missing values
+# (dropped with non-IP packets by Extractor.dropNaN)
+HEADER_NA = {col: [col] for col in CSV_DTYPES}
+
+# Converted packet table (see Extractor.convertColumns)
+PACKET_DTYPES = {
+    'frame.time_epoch': np.int64, # ns since epoch
+    'ip.len': np.uint16,
+    'ip.proto': np.uint8,
+    'ip.src': np.uint32,
+    'ip.dst': np.uint32,
+    'ip.ttl': np.uint8,
+    'tcp.flags': np.uint16, # 12 bits including NS/reserved
+    'srcport': np.uint16,
+    'dstport': np.uint16,
+}
+
+def to_uint(series, dtype):
+    # Missing values become 0
+    return series.fillna(0).to_numpy().astype(dtype)
+
+def decode_distinct(series, decode, dtype):
+    # Apply decode to each distinct string only; missing values become 0
+    codes, uniques = pd.factorize(series)
+    values = np.array([decode(str(value)) for value in uniques] + [0], dtype=dtype)
+    return values[codes] # Code -1 (missing) picks the trailing 0
+
+def ip_to_uint32(address):
+    a, b, c, d = address.split('.')
+    return int(a) << 24 | int(b) << 16 | int(c) << 8 | int(d)
+
+def ip_strings(addresses):
+    # Dotted quads for uint32 addresses
+    def dotted(address):
+        return '.'.join(str(address >> shift & 0xFF) for shift in (24, 16, 8, 0))
+    codes, uniques = pd.factorize(addresses)
+    return np.array([dotted(int(address)) for address in uniques], dtype=object)[codes]
+
+def epoch_ns(series):
+    # Float seconds (or their strings) to int64 ns, rounded like pd.to_datetime
+    return pd.to_datetime(series.astype(np.float64), unit='s').to_numpy().view(np.int64)
@@ -0,0 +1,116 @@
+import numpy as np
+import json
+
+# NumPy-only inference for the tied-weight autoencoder (see Autoencoder.py).
+# export_weights writes a trained Keras model's kernels, biases and activations
+# to one .npz; Scorer reproduces autoencoder.predict (float32, as Keras) and the
+# MAE reconstruction error used in Loader.py without importing TensorFlow.
+
+def _activation_config(activation):
+    # Name (and LeakyReLU slope) of a Keras activation function or layer, or of its name
+    if hasattr(activation, 'alpha'): # LeakyReLU layer used as an activation
+        return {'activation': 'leaky_relu', 'alpha': float(np.asarray(activation.alpha))}
+    if isinstance(activation, str):
+        name = activation
+    else:
+        name = getattr(activation, '__name__', None) or activation.__class__.__name__.lower()
+    return {'activation': 'leaky_relu' if name == 'leakyrelu' else name, 'alpha': 0.3}
+
+def _bias(layer):
+    # A DenseTranspose's own bias. Its weights also hold those of the Dense it is tied
+    # to, so for layers revived without custom_objects it is picked by name
+    if hasattr(layer, 'biases'):
+        return layer.biases
+    for weight in layer.weights:
+        scope, name = weight.name.split(':')[0].split('/')[-2:]
+        if scope == layer.name and name == 'bias':
+            return weight
+    raise ValueError(f"No bias of its own in layer {layer.name}")
+
+def _units(layer):
+    # Output size of a Dense or DenseTranspose layer
+    return layer.kernel.shape[1] if hasattr(layer, 'kernel') else _bias(layer).shape[0]
+
+def _tied_layer(model, i):
+    # Dense layer a DenseTranspose is tied to. Layers revived from a SavedModel without
+    # custom_objects may lose the reference; the tied kernel is then found by its shape
+    layer = model.layers[i]
+    tied = [j for j, other in enumerate(model.layers) if other is getattr(layer, 'dense', None)]
+    if tied:
+        return tied[0]
+    outputs, inputs = _units(layer), _units(model.layers[i-1])
+    for j, other in enumerate(model.layers[:i]):
+        if hasattr(other, 'kernel') and tuple(other.kernel.shape) == (outputs, inputs):
+            return j
+    raise ValueError(f"No kernel of shape {(outputs, inputs)} for layer {layer.name}")
+
+def export_weights(model, file, activation=None):
+    # Dense layers keep their kernel; DenseTranspose layers refer to the layer they are
+    # tied to (its kernel, transposed) and keep their own bias.
+    # activation (e.g. LeakyReLU(), or one per layer as Autoencoder.layer_activations
+    # gives) is used for layers that do not expose theirs
+    layers, arrays = [], {}
+    for i, layer in enumerate(model.layers):
+        fallback = activation[i] if isinstance(activation, (list, tuple)) else activation
+        layer_activation = getattr(layer, 'activation', None) or fallback
+        if layer_activation is None:
+            raise ValueError(f"Layer {layer.name} does not expose its activation (revived without "
+                             "custom_objects?); pass activation= to export_weights")
+        config = _activation_config(layer_activation)
+        if not hasattr(layer, 'kernel'): # DenseTranspose
+            config.update({'kind': 'transpose', 'tied': _tied_layer(model, i)})
+            arrays[f'bias_{i}'] = _bias(layer).numpy()
+        else:
+            config['kind'] = 'dense'
+            arrays[f'kernel_{i}'] = layer.kernel.numpy()
+            arrays[f'bias_{i}'] = layer.bias.numpy() if layer.use_bias else np.zeros(layer.units, dtype=np.float32)
+        layers.append(config)
+    np.savez(file, config=np.array(json.dumps(layers)), **arrays)
+
+def leaky_relu(x, alpha=0.3):
+    # tf.nn.leaky_relu for alpha <= 1
+    return np.maximum(x, x * np.float32(alpha))
+
+ACTIVATIONS = {
+    'linear': lambda x, alpha: x,
+    'relu': lambda x, alpha: np.maximum(x, 0),
+    'leaky_relu': leaky_relu,
+    'sigmoid': lambda x, alpha: 1 / (1 + np.exp(-x)),
+    'tanh': lambda x, alpha: np.tanh(x),
+}
+
+class Scorer:
+    def __init__(self, layers):
+        # layers: (kernel, bias, activation, alpha) in model order, kernels input x output
+        self.layers = [(np.asarray(kernel, dtype=np.float32), np.asarray(bias, dtype=np.float32),
+                        ACTIVATIONS[activation], alpha) for kernel, bias, activation, alpha in layers]
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as arrays:
+            configs = json.loads(str(arrays['config']))
+            layers = []
+            for i, config in enumerate(configs):
+                if config['kind'] == 'transpose':
+                    kernel = arrays[f"kernel_{config['tied']}"].T
+                else:
+                    kernel = arrays[f'kernel_{i}']
+                layers.append((kernel, arrays[f'bias_{i}'], config['activation'], config['alpha']))
+        return cls(layers)
+    def predict(self, X, batch_size=65536):
+        # Reconstructions (float32), computed in batches of rows
+        X = np.asarray(X, dtype=np.float32)
+        out = np.empty((X.shape[0], self.layers[-1][0].shape[1]), dtype=np.float32)
+        for start in range(0, X.shape[0], batch_size):
+            h = X[start:start + batch_size]
+            for kernel, bias, activation, alpha in self.layers:
+                h = activation(h @ kernel + bias, alpha)
+            out[start:start + batch_size] = h
+        return out
+    def errors(self, X, batch_size=65536):
+        # Mean absolute reconstruction error of every row (as Loader.py)
+        X = np.asarray(X, dtype=np.float64)
+        errors = np.empty(X.shape[0])
+        for start in range(0, X.shape[0], batch_size):
+            batch = X[start:start + batch_size]
+            errors[start:start + batch_size] = np.mean(np.abs(self.predict(batch, batch_size) - batch), axis=1)
+        return errors
@@ -0,0 +1,206 @@
+import asyncio
+import collections
+import json
+import os
+import time
+import numpy as np
+
+from Calibration import Calibration
+from Scorer import Scorer
+
+# Long-running scoring service. The Scorer and its calibrated threshold stay resident;
+# subflow feature vectors arrive as JSON lines over a Unix socket or localhost TCP and
+# are micro-batched: a batch is scored once it holds max_batch vectors or its oldest
+# vector has waited max_delay seconds. Responses come back in request order.
+#   request:  {"id": 7, "features": [f1, ..., fn]}   (feature_cols order, without Anomaly)
+#   response: {"id": 7, "error": 0.0123, "anomaly": false}
+#   {"metrics": true} returns the server's throughput and latency percentiles
+
+def percentiles(values, qs=(50, 99)):
+    # Milliseconds
+    if not len(values):
+        return {f'p{q}_ms': None for q in qs}
+    return {f'p{q}_ms': float(np.percentile(values, q)) * 1e3 for q in qs}
+
+async def open_connection(address):
+    # address: Unix socket path or (host, port)
+    if isinstance(address, str):
+        return await asyncio.open_unix_connection(address)
+    return await asyncio.open_connection(*address)
+
+class ScoringServer:
+    def __init__(self, weights_file, calibration_file=None, threshold=None, num_sd=3, max_batch=1024,
+                 max_delay=0.002, latency_window=10**5):
+        self.scorer = Scorer.load(weights_file)
+        if threshold is None:
+            # Loader.py's threshold: largest clean error within num_sd standard deviations
+            threshold = Calibration.load(calibration_file).sdThreshold(num_sd)[0]
+        self.threshold = threshold
+        self.dim = self.scorer.layers[0][0].shape[0]
+        self.max_batch = max_batch
+        self.max_delay = max_delay # Seconds the oldest request may wait for its batch to fill
+        self.pending = [] # (features, future, time received)
+        self.arrived = None # Set when a batch is started or filled
+        self.latencies = collections.deque(maxlen=latency_window) # Received to scored, recent requests
+        self.scored = 0
+        self.batches = 0
+        self.first = None # Time of the first request
+    async def serve(self, address):
+        self.arrived = asyncio.Event()
+        batches = asyncio.create_task(self.batchLoop())
+        if isinstance(address, str):
+            if os.path.exists(address):
+                os.remove(address)
+            server = await asyncio.start_unix_server(self.handle, path=address)
+        else:
+            server = await asyncio.start_server(self.handle, *address)
+        print(f"Scoring on {address} (threshold {self.threshold})", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batches.cancel()
+    def submit(self, features, received):
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((features, future, received))
+        if len(self.pending) in (1, self.max_batch):
+            self.arrived.set()
+        return future
+    async def batchLoop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            if not self.pending:
+                self.arrived.clear()
+                await self.arrived.wait()
+                continue
+            # Wait for a full batch or the oldest request's deadline
+            deadline = self.pending[0][2] + self.max_delay
+            while len(self.pending) < self.max_batch and (remaining := deadline - time.perf_counter()) > 0:
+                self.arrived.clear()
+                try:
+                    await asyncio.wait_for(self.arrived.wait(), remaining)
+                except asyncio.TimeoutError:
+                    break
+            batch, self.pending = self.pending[:self.max_batch], self.pending[self.max_batch:]
+            try:
+                X = np.stack([features for features, future, received in batch])
+                # Scored off the event loop, so requests keep arriving for the next batch
+                errors = await loop.run_in_executor(None, self.scorer.errors, X)
+            except Exception as e:
+                # The batch fails, not the server: its requests get failed replies
+                for features, future, received in batch:
+                    if not future.cancelled():
+                        future.set_exception(e)
+                continue
+            done = time.perf_counter()
+            for (features, future, received), error in zip(batch, errors):
+                if not future.cancelled():
+                    future.set_result(float(error))
+                self.latencies.append(done - received)
+            self.scored += len(batch)
+            self.batches += 1
+    async def handle(self, reader, writer):
+        # One client: requests are read and queued while earlier ones are scored
+        responses = asyncio.Queue()
+        sender = asyncio.create_task(self.send(responses, writer))
+        try:
+            while line := await reader.readline():
+                received = time.perf_counter()
+                self.first = self.first or received
+                request = None
+                try:
+                    request = json.loads(line)
+                    if request.get('metrics'):
+                        await responses.put((None, self.metrics()))
+                        continue
+                    features = np.asarray(request['features'], dtype=np.float64)
+                    if features.shape != (self.dim,):
+                        raise ValueError(f"expected {self.dim} features, got shape {features.shape}")
+                    if not np.isfinite(features).all():
+                        raise ValueError("features must be finite")
+                    await responses.put((request.get('id'), self.submit(features, received)))
+                except (ValueError, KeyError, TypeError, AttributeError) as e:
+                    request_id = request.get('id') if isinstance(request, dict) else None
+                    await responses.put((None, {'id': request_id, 'failed': str(e)}))
+        except ConnectionError:
+            pass
+        finally:
+            await responses.put(None)
+            await sender
+            writer.close()
+    async def send(self, responses, writer):
+        while (item := await responses.get()) is not None:
+            request_id, result = item
+            if isinstance(result, asyncio.Future):
+                try:
+                    error = await result
+                    result = {'id': request_id, 'error': error, 'anomaly': error > self.threshold}
+                except Exception as e:
+                    result = {'id': request_id, 'failed': str(e)}
+            try:
+                writer.write((json.dumps(result) + '\n').encode())
+                if responses.empty():
+                    await writer.drain()
+            except ConnectionError:
+                return
+    def metrics(self):
+        elapsed = time.perf_counter() - self.first if self.first else 0
+        return {
+            'scored': self.scored,
+            'batches': self.batches,
+            'mean_batch': self.scored / self.batches if self.batches else None,
+            'throughput_per_s': self.scored / elapsed if elapsed else None,
+            **percentiles(np.array(self.latencies)),
+            'threshold': self.threshold,
+        }
+
+async def load_connection(address, X, window, latencies):
+    # Pipeline rows of X with at most window requests in flight; returns the responses
+    # (failed ones included: replies come back in request order)
+    reader, writer = await open_connection(address)
+    slots = asyncio.Semaphore(window)
+    sent = collections.deque() # Send times of the requests in flight
+    async def send():
+        for i, row in enumerate(X):
+            await slots.acquire()
+            sent.append(time.perf_counter())
+            writer.write((json.dumps({'id': i, 'features': row.tolist()}) + '\n').encode())
+            await writer.drain()
+    sender = asyncio.create_task(send())
+    responses = []
+    for _ in range(len(X)):
+        response = json.loads(await reader.readline())
+        start = sent.popleft()
+        if 'failed' not in response:
+            latencies.append(time.perf_counter() - start)
+        slots.release()
+        responses.append(response)
+    await sender
+    writer.close()
+    return responses
+
+async def load_test(address, X, connections=4, window=256):
+    # Load generator: X split across connections; client-side throughput and latency
+    latencies = []
+    start = time.perf_counter()
+    results = await asyncio.gather(*[load_connection(address, part, window, latencies)
+                                     for part in np.array_split(X, connections)])
+    elapsed = time.perf_counter() - start
+    reader, writer = await open_connection(address)
+    writer.write(b'{"metrics": true}\n')
+    server = json.loads(await reader.readline())
+    writer.close()
+    return {
+        'requests': len(X),
+        'throughput_per_s': len(X) / elapsed,
+        **percentiles(np.array(latencies)),
+        'anomalies': sum(response.get('anomaly', False) for part in results for response in part),
+        'failed': sum('failed' in response for part in results for response in part),
+        'server': server,
+    }
+
+if __name__ == "__main__":
+    # Server.py [--model <model.tf>] [--serve host:port|socket]: see Pipeline.py
+    import sys
+    from Pipeline import main
+    main(['score', '--serve', '127.0.0.1:8765', *sys.argv[1:]])
@@ -0,0 +1,104 @@
+import pandas as pd
+import numpy as np
+import multiprocessing as mp
+import os
+import time
+
+from Anomalies import with_anomalies
+from Calibration import Calibration
+from Dataset import split_rows
+from Loader import detection_metrics, model_files
+from Parallel import attach_arrays, share_arrays
+from Scorer import Scorer, export_weights
+
+# Trains the autoencoder configurations of Autoencoder.py concurrently, one
+# worker process per configuration with a bounded number of TensorFlow threads.
+# The clean feature matrix and the anomaly evaluation set are copied into shared
+# memory once; workers attach to them. Each worker keeps its best epoch, exports
+# the weights for Scorer and evaluates them as Loader.py does (3-sd threshold of
+# the clean reconstruction errors); results are collected into one table.
+
+def init_worker(specs, threads):
+    # Thread limits must be set before TensorFlow starts its thread pools
+    for var in ('OMP_NUM_THREADS', 'OPENBLAS_NUM_THREADS', 'MKL_NUM_THREADS'):
+        os.environ[var] = str(threads)
+    os.environ.setdefault('TF_CPP_MIN_LOG_LEVEL', '2')
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    global worker_blocks, worker_arrays
+    worker_blocks, worker_arrays = attach_arrays(specs)
+
+def train_config(task):
+    number, options, model_path, nb_epoch, batch_size, num_sd, seed = task
+    import tensorflow as tf
+    from Autoencoder import BestWeights, build_autoencoder, model_name, train_autoencoder
+    tf.keras.utils.set_random_seed(seed + number)
+    X = worker_arrays['X']
+    train_rows = split_rows(X.shape[0])
+    autoencoder = build_autoencoder(X.shape[1], **options)
+    best = BestWeights()
+    start = time.perf_counter()
+    history = train_autoencoder(autoencoder, X[:train_rows], X[train_rows:], model_path + model_name(number),
+                                nb_epoch, batch_size, callbacks=[best], verbose=0, weights_only=True)
+    train_s = time.perf_counter() - start
+    # Best epoch's weights, as Loader.py loads them
+    weights_file = model_files(model_path + model_name(number))[0]
+    export_weights(autoencoder, weights_file)
+    scorer = Scorer.load(weights_file)
+    calibration = Calibration().update(scorer.errors(X))
+    sd_threshold, removed, exact = calibration.sdThreshold(num_sd)
+    errors = scorer.errors(worker_arrays['X_dirty'])
+    return {
+        'model': number, **options,
+        'best_val_loss': best.best,
+        'best_epoch': None if best.best_epoch is None else best.best_epoch + 1, # val_loss never finite
+        'final_loss': history['loss'][-1],
+        'epochs': len(history['loss']),
+        'train_s': train_s,
+        'threshold': sd_threshold,
+        **detection_metrics(errors, worker_arrays['y_dirty'], sd_threshold),
+    }
+
+def sweep(df, numbers=None, model_path='models/', nb_epoch=700, batch_size=32, workers=None, threads=1,
+          num_sd=3, anomalies=None, seed=0):
+    # Train configurations (numbers of Autoencoder.configurations(), default all 16)
+    # concurrently; returns one row of results per configuration
+    from Autoencoder import configurations
+    configs = configurations()
+    numbers = numbers or list(configs)
+    workers = workers or max(1, min(len(numbers), (os.cpu_count() or 1) // threads))
+    features = df.columns[:-1]
+    num_mal = int(np.ceil(df.shape[0] / 5)) # 20% of clean subflows, as Loader.py
+    dirty = with_anomalies(df, anomalies or {'gradient': num_mal}, seed=seed)
+    arrays = {
+        'X': df[features].to_numpy(dtype=np.float64),
+        'X_dirty': dirty[features].to_numpy(dtype=np.float64),
+        'y_dirty': dirty['Anomaly'].to_numpy(dtype=np.int64),
+    }
+    if not os.path.exists(model_path):
+        os.makedirs(model_path)
+    tasks = [(number, configs[number], model_path, nb_epoch, batch_size, num_sd, seed) for number in numbers]
+    print(f"Training {len(tasks)} configurations on {workers} workers x {threads} threads...")
+    blocks, specs = share_arrays(arrays)
+    try:
+        # A fresh (spawned, not forked from a process that imported TensorFlow) process
+        # per configuration, so no TensorFlow state is shared
+        context = mp.get_context('spawn')
+        with context.Pool(workers, initializer=init_worker, initargs=(specs, threads), maxtasksperchild=1) as pool:
+            results = []
+            for result in pool.imap_unordered(train_config, tasks):
+                print(f"Model {result['model']}: val_loss {result['best_val_loss']:.6f}, "
+                      f"f1 {result['f1']:.4f}, {result['train_s']:.0f} s", flush=True)
+                results.append(result)
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+    return pd.DataFrame(results).sort_values('model').reset_index(drop=True)
+
+if __name__ == "__main__":
+    # Sweep.py --features <features.csv> [train options]: see Pipeline.py
+    import sys
+    from Pipeline import main
+    main(['train', '--sweep', *sys.argv[1:]])